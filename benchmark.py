@@ -0,0 +1,276 @@
+"""Headless benchmark for the dashboard data pipeline and figure builders.
+
+Runs without a Streamlit server: times parsing the workbook into a cache
+partition and reading the partition back (memory-mapped), cube building, the summary engine, every create_* builder (validated go.Figure
+serialized the way st.plotly_chart does vs a miss and a hit of the shared
+figure cache) and the exports on the real workbook and on synthetic data
+scaled up with more years and kelurahan.
+
+    python benchmark.py                          # scale 1, 10, 100, 1000
+    python benchmark.py --scales 1 10 --output before.json
+    python benchmark.py --compare before.json    # print ratios vs an older run
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.io as pio
+import plotly.tools
+import streamlit.logger
+
+# Import dashboard di luar `streamlit run` memunculkan warning "bare mode"
+streamlit.logger.set_log_level('error')
+
+import dashboard_samarinda as dash
+
+DEFAULT_SCALES = [1, 10, 100, 1000]
+# Cube padat [tahun, wilayah, kelamin, umur] bisa sangat besar pada skala tinggi;
+# stage yang butuh cube dilewati kalau estimasinya di atas batas ini
+DEFAULT_MAX_CUBE_MB = 1024
+
+
+def time_call(fn, repeats):
+    """Run fn repeats times; return timing stats in milliseconds and the last result"""
+    samples = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'min_ms': min(samples),
+        'median_ms': statistics.median(samples),
+        'mean_ms': statistics.fmean(samples),
+        'repeats': repeats,
+    }, result
+
+
+def synthetic_frame(base, scale, seed=0):
+    """Scale the real frame ~scale times by adding years and kelurahan copies"""
+    if scale == 1:
+        return base
+    year_mult = max(1, round(scale ** (1 / 3)))
+    kel_mult = int(np.ceil(scale / year_mult))
+    reps = year_mult * kel_mult
+    rng = np.random.default_rng(seed)
+
+    # Bangun langsung dari kode kategori supaya tidak perlu materialisasi jutaan string
+    base_years = [int(y) for y in base['tahun'].cat.categories]
+    span = max(base_years) - min(base_years) + 1
+    year_offset = np.array([y - min(base_years) for y in base_years])[base['tahun'].cat.codes.to_numpy()]
+    year_codes = np.concatenate([
+        np.tile(year_offset + yi * span, kel_mult) for yi in range(year_mult)
+    ])
+    years = [str(min(base_years) + i) for i in range(span * year_mult)]
+
+    kel_names = list(base['kelurahan'].cat.categories)
+    kel_base = base['kelurahan'].cat.codes.to_numpy().astype(np.int64)
+    kel_codes = np.tile(np.concatenate([kel_base + ki * len(kel_names) for ki in range(kel_mult)]), year_mult)
+    kelurahan = [name if ki == 0 else f'{name} {ki}' for ki in range(kel_mult) for name in kel_names]
+
+    def categorical(codes, categories):
+        values = pd.Categorical.from_codes(codes, categories=categories)
+        return values.reorder_categories(sorted(categories), ordered=True)
+
+    jumlah = np.tile(base['jumlah'].to_numpy().astype(np.float64), reps)
+    jumlah = np.rint(jumlah * rng.uniform(0.9, 1.1, size=len(jumlah))).astype(np.uint32)
+
+    return pd.DataFrame({
+        'tahun': categorical(year_codes, years),
+        'kecamatan': pd.Categorical.from_codes(np.tile(base['kecamatan'].cat.codes.to_numpy(), reps),
+                                               dtype=base['kecamatan'].dtype),
+        'kelurahan': categorical(kel_codes, kelurahan),
+        'kelamin': pd.Categorical.from_codes(np.tile(base['kelamin'].cat.codes.to_numpy(), reps),
+                                             dtype=base['kelamin'].dtype),
+        'umur': np.tile(base['umur'].to_numpy(), reps),
+        'jumlah': jumlah,
+    })
+
+
+def cube_bytes_estimate(df):
+    """Bytes of counts + cum_age + area_cum_age for a dense cube of this frame"""
+    kelurahan_codes = df['kelurahan'].cat.codes.to_numpy().astype(np.int64)
+    wilayah = np.unique(df['kecamatan'].cat.codes.to_numpy() * (kelurahan_codes.max() + 1) + kelurahan_codes)
+    cells = df['tahun'].nunique() * len(wilayah) * len(dash.SEXES) * (dash.MAX_AGE + 1)
+    return int(cells * 8 * 2.5)
+
+
+def plotly_chart_spec(figure):
+    """The JSON st.plotly_chart builds from a go.Figure on every call"""
+    return pio.to_json(plotly.tools.return_figure_from_figure_or_data(figure, validate_figure=True), validate=False)
+
+
+def benchmark_builders(cube, repeats):
+    """Time the summary engine and every figure builder on the default view"""
+    stages = {}
+    key = dash.FilterKey(year=cube.years[-1])
+
+    stages['select_cube'], selection = time_call(lambda: dash.select_key(cube, key), repeats)
+    stages['compute_summary'], summary = time_call(lambda: dash.compute_summary(selection, cube), repeats)
+
+    # (builder tervalidasi go.Figure, builder spec cepat, argumen)
+    ranking = selection.kelurahan_ranking()
+    builders = {
+        'population_pyramid': (dash.create_population_pyramid, dash.population_pyramid_spec,
+                               dash.pyramid_inputs(cube, key)),
+        'kecamatan_bar_chart': (dash.create_kecamatan_bar_chart, dash.kecamatan_bar_spec, (selection.kecamatan_sex_frame(),)),
+        'kelurahan_bar_chart': (dash.create_kelurahan_bar_chart, dash.kelurahan_bar_spec, (ranking, 15)),
+        'gender_pie_chart': (dash.create_gender_pie_chart, dash.gender_pie_spec, (selection.sex_frame(),)),
+        'year_trend_chart': (dash.create_year_trend_chart, dash.year_trend_spec, (dash.year_sex_frame(cube),)),
+        'total_sparkline': (dash.create_total_sparkline, dash.total_sparkline_spec, (summary,)),
+        'growth_sparkline': (dash.create_growth_sparkline, dash.growth_sparkline_spec, (summary,)),
+        'produktif_donut': (dash.create_produktif_donut, dash.produktif_donut_spec, (summary,)),
+        'dependency_gauge': (dash.create_dependency_gauge, dash.dependency_gauge_spec, (summary,)),
+        'top_kecamatan_sparkline': (dash.create_top_kecamatan_sparkline, dash.top_kecamatan_sparkline_spec, (summary,)),
+    }
+    cache = dash.FigureCache(dash.FIGURE_CACHE_MAX_BYTES, sizeof=lambda figure: len(figure.spec))
+    for name, (create, spec, args) in builders.items():
+        stages[f'create_{name}'], _ = time_call(lambda: create(*args), repeats)
+        # Tanpa cache: go.Figure tervalidasi + yang dikerjakan st.plotly_chart (to_dict + to_json)
+        stages[f'create_{name}[plotly_chart]'], _ = time_call(lambda: plotly_chart_spec(create(*args)), repeats)
+        # Jalur cached_figure + show_figure: miss = spec + render_figure, hit = lookup JSON jadi
+        stages[f'{name}[cache miss]'], _ = time_call(lambda: dash.render_figure(spec(*args)), repeats)
+        cache.get_or_build(name, lambda: dash.render_figure(spec(*args)))
+        stages[f'{name}[cache hit]'], _ = time_call(lambda: cache.get_or_build(name, None).spec, repeats)
+    return stages
+
+
+def benchmark_exports(df, year, repeats):
+    """Time the Data Mentah filter and each export format for one year"""
+    stages = {}
+    stages['filter_frame'], filtered = time_call(lambda: dash.filter_frame(df, year), repeats)
+    for fmt in dash.EXPORT_FORMATS:
+        stats, payload = time_call(lambda: dash.encode_export(filtered, fmt), repeats)
+        stats['bytes'] = len(payload)
+        stages[f'export[{fmt}]'] = stats
+    return stages
+
+
+def benchmark_scale(base, scale, args, tmp_dir, source_path):
+    """Run every stage for one scale factor"""
+    repeats = args.repeats if scale <= 10 else 1
+    df = synthetic_frame(base, scale)
+    result = {
+        'rows': len(df),
+        'years': int(df['tahun'].nunique()),
+        'kecamatan': int(df['kecamatan'].nunique()),
+        'kelurahan': int(df['kelurahan'].nunique()),
+        'frame_bytes': int(df.memory_usage(deep=True).sum()),
+        # memory_usage(deep=True) per kolom: skema lama (string + int64) vs skema compact
+        'frame_memory': dash.memory_report(dash.uncompacted_frame(df), df).to_dict('index'),
+        'stages': {},
+    }
+    stages = result['stages']
+    cache_path = os.path.join(tmp_dir, f'penduduk_x{scale}.arrow')
+    fingerprint = dash.source_fingerprint(source_path)
+    sha256 = fingerprint['source_sha256']
+
+    if scale == 1:
+        # Parse Excel + tulis partisi cache (bagian load_dataset untuk file baru/berubah)
+        def cold():
+            frame = dash.parse_workbook(source_path)
+            dash.write_cached_frame(frame, cache_path, fingerprint)
+            return frame
+        stages['parse_workbook+cache_write'], _ = time_call(cold, max(1, min(repeats, 3)))
+    else:
+        stages['cache_write'], _ = time_call(lambda: dash.write_cached_frame(df, cache_path, fingerprint), 1)
+    # Baca partisi memory-mapped (bagian load_dataset untuk file yang sudah di-cache)
+    stages['cache_read'], _ = time_call(lambda: dash.read_cached_frame(cache_path, sha256), repeats)
+
+    estimate = cube_bytes_estimate(df)
+    result['cube_bytes_estimate'] = estimate
+    if estimate > args.max_cube_mb * 1024 * 1024:
+        result['skipped'] = f'cube stages skipped: estimated {estimate / 2**20:.0f} MB > --max-cube-mb {args.max_cube_mb}'
+    else:
+        stages['build_cube'], cube = time_call(lambda: dash.build_cube(df), 1 if scale > 1 else repeats)
+        stages.update(benchmark_builders(cube, args.repeats))
+        del cube
+
+    stages.update(benchmark_exports(df, df['tahun'].cat.categories[-1], repeats))
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous_path):
+    """Print median-time ratios (current / previous) per stage"""
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nPerbandingan vs {previous_path} ({previous['meta'].get('commit')}):")
+    for scale, result in current['results'].items():
+        old = previous['results'].get(scale)
+        if not old:
+            continue
+        for stage, stats in result['stages'].items():
+            old_stats = old['stages'].get(stage)
+            if old_stats:
+                ratio = stats['median_ms'] / old_stats['median_ms'] if old_stats['median_ms'] else float('inf')
+                print(f"  x{scale:<5} {stage:<46} {old_stats['median_ms']:10.2f} -> {stats['median_ms']:10.2f} ms  ({ratio:.2f}x)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--max-cube-mb', type=int, default=DEFAULT_MAX_CUBE_MB)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='older benchmark JSON to compare against')
+    args = parser.parse_args(argv)
+
+    source_path = dash.find_data_files()[0]
+    base = dash.parse_workbook(source_path)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plotly': plotly.__version__,
+            'source': source_path,
+        },
+        'results': {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for scale in args.scales:
+            print(f"Skala x{scale} ...", file=sys.stderr)
+            result = benchmark_scale(base, scale, args, tmp_dir, source_path)
+            report['results'][str(scale)] = result
+            memory = result['frame_memory']['total']
+            print(f"  frame {memory['before'] / 2**20:.2f} MB -> {memory['after'] / 2**20:.2f} MB "
+                  f"({memory['ratio']:.1f}x)", file=sys.stderr)
+            for stage, stats in result['stages'].items():
+                print(f"  {stage:<46} {stats['median_ms']:10.3f} ms", file=sys.stderr)
+            if 'skipped' in result:
+                print(f"  {result['skipped']}", file=sys.stderr)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Hasil ditulis ke {args.output}", file=sys.stderr)
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Build static snapshot bundles of the single-year view for the Satudata embed.
+
+Renders the default view and every kecamatan view of each year to JSON bundles
+(KPI values, detail tables and Plotly figure JSON) plus a static viewer page, so
+embed traffic can be served as plain files without a Streamlit session. Filters
+outside the snapshot (kelurahan, umur, multi tahun) open the live app instead.
+Also writes client.html, the same viewer with the whole cube embedded, where every
+single-year filter runs in the browser.
+
+    python build_snapshots.py                        # -> snapshots/
+    python build_snapshots.py --output public --live-url https://dashboard-kependudukan.streamlit.app
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+import streamlit.logger
+
+# Import dashboard di luar `streamlit run` memunculkan warning "bare mode"
+streamlit.logger.set_log_level('error')
+
+import dashboard_samarinda as dash
+
+DEFAULT_OUTPUT = 'snapshots'
+DEFAULT_LIVE_URL = 'https://dashboard-kependudukan.streamlit.app'
+
+
+def slugify(name):
+    return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+
+
+def bundle_path(key):
+    """Bundle path of a FilterKey relative to the output: <tahun>/semua.json or <tahun>/<kecamatan>.json"""
+    name = slugify(key.kecamatan[0]) if key.kecamatan else 'semua'
+    return f'{key.year}/{name}.json'
+
+
+def write_bytes(path, payload):
+    """Write via a temp file + rename so a half-written bundle is never served"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def build(output, live_url, top_n):
+    """Write every bundle, the manifest, plotly.min.js, index.html and client.html; returns the manifest"""
+    cube = dash.load_cube()
+    if cube is None:
+        raise SystemExit("Gagal memuat data")
+
+    bundles = {}
+    total_bytes = 0
+    for key in dash.snapshot_keys(cube):
+        path = bundle_path(key)
+        payload = dash.figure_json(dash.snapshot_bundle(cube, key, top_n))
+        write_bytes(os.path.join(output, path), payload)
+        total_bytes += len(payload)
+        bundles.setdefault(key.year, {})[key.kecamatan[0] if key.kecamatan else ''] = path
+
+    template = pio.templates[pio.templates.default].to_plotly_json()
+    manifest = {
+        'built_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'data_version': cube.version,
+        'live_url': live_url,
+        'years': sorted(cube.years, reverse=True),
+        'kecamatan': {year: list(cube.hierarchy[year].kecamatan) for year in cube.years},
+        'bundles': bundles,
+        'query_keys': list(dash.QUERY_FILTER_KEYS),
+        'top_n': top_n,
+        'template': template,
+    }
+    write_bytes(os.path.join(output, 'manifest.json'), dash.figure_json(manifest))
+    write_bytes(os.path.join(output, 'plotly.min.js'), get_plotlyjs().encode('utf-8'))
+    index = dash.render_viewer({'type': 'snapshot'}, 'plotly.min.js')
+    write_bytes(os.path.join(output, 'index.html'), index.encode('utf-8'))
+    client = dash.render_viewer(dash.client_payload(cube, live_url, top_n=top_n), 'plotly.min.js')
+    write_bytes(os.path.join(output, 'client.html'), client.encode('utf-8'))
+    manifest['bundle_bytes'] = total_bytes
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--live-url', default=DEFAULT_LIVE_URL,
+                        help='URL app Streamlit untuk filter di luar snapshot')
+    parser.add_argument('--top-n', type=int, default=dash.TOP_N_DEFAULT)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    manifest = build(args.output, args.live_url.rstrip('/'), args.top_n)
+    n_bundles = sum(len(views) for views in manifest['bundles'].values())
+    print(f"{n_bundles} bundle ({manifest['bundle_bytes'] / 1024:.0f} KB) untuk tahun "
+          f"{', '.join(manifest['years'])} ditulis ke {args.output}/ "
+          f"dalam {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,53 @@
+import atexit
+import base64
+import csv
+import functools
+import glob
+import gzip
+import hashlib
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import NamedTuple, Optional
+
+import numpy as np
+import openpyxl
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import plotly.graph_objects as go
 import plotly.express as px
+import plotly.io as pio
+from plotly.offline import get_plotlyjs_version
+import streamlit.components.v1 as components
+from streamlit.errors import StreamlitAPIException
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+try:
+    import orjson
+except ImportError:  # Opsional: tanpa orjson dipakai modul json standar
+    orjson = None
+
+# API internal streamlit untuk mengirim JSON figure dari cache apa adanya (lihat show_figure).
+# Bukan API publik: kalau import atau pemanggilannya gagal di versi lain, show_figure
+# kembali ke st.plotly_chart.
+try:
+    from streamlit.elements.lib.form_utils import current_form_id
+    from streamlit.elements.lib.layout_utils import LayoutConfig
+    from streamlit.elements.lib.utils import compute_and_register_element_id
+    from streamlit.proto.PlotlyChart_pb2 import PlotlyChart as PlotlyChartProto
+except ImportError:  # Versi lain: kembali ke st.plotly_chart
+    PlotlyChartProto = None
 
 st.set_page_config(
     page_title="Dashboard Kependudukan Samarinda 2022-2024",
@@ -10,280 +56,2292 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+logger = logging.getLogger(__name__)
+
+# ===== INSTRUMENTATION =====
+# Waktu per langkah hot path (load, filter, ringkasan, builder figure, tabel, export)
+# dicatat ke recorder bersama semua session: sampel terakhir per langkah untuk p50/p95,
+# langkah rerun terakhir per session untuk panel debug, dan opsional file JSON-lines.
+PERF_LOG_PATH = os.environ.get('DASHBOARD_PERF_LOG')
+PERF_WINDOW = 1000        # sampel per langkah untuk persentil
+PERF_SESSIONS = 256       # session yang rerun terakhirnya disimpan
+PERF_FLUSH_RECORDS = 256  # baris log yang ditampung sebelum ditulis ke file
+PERF_FLUSH_INTERVAL_S = 2.0
+TRUTHY_FLAGS = frozenset({'1', 'true', 'yes', 'on'})
+
+def flag_enabled(value):
+    """True for an explicit on value of a query param or env flag ('1', 'true', 'yes', 'on')"""
+    return (value or '').strip().lower() in TRUTHY_FLAGS
+
+DEBUG_ENABLED = flag_enabled(os.environ.get('DASHBOARD_DEBUG'))
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending sequence
+
+    Dipakai juga oleh load_test.py dan serving_profile.py, supaya ketiga alat
+    melaporkan p50/p95 yang sama untuk sampel yang sama.
+    """
+    return sorted_values[max(0, math.ceil(pct * len(sorted_values) / 100) - 1)]
+
+class PerfRecorder:
+    """Thread-safe per-step timing samples with p50/p95 and an optional JSON-lines sink
+
+    Baris log ditampung di memori dan ditulis per batch (tiap PERF_FLUSH_RECORDS baris
+    atau PERF_FLUSH_INTERVAL_S detik), di luar lock sampel, supaya session tidak antre
+    pada I/O file di hot path.
+    """
+    
+    def __init__(self, log_path=None, window=PERF_WINDOW):
+        self.log_path = log_path
+        self.window = window
+        self._samples = {}
+        self._counts = {}
+        self._runs = OrderedDict()  # session_id -> langkah rerun terakhir
+        self._pending = []          # baris log yang belum ditulis
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+    
+    def start_run(self, session_id):
+        with self._lock:
+            self._runs[session_id] = []
+            self._runs.move_to_end(session_id)
+            while len(self._runs) > PERF_SESSIONS:
+                self._runs.popitem(last=False)
+    
+    def record(self, step, wall_ms, rows=None, nbytes=None, session_id=None):
+        entry = {'ts': round(time.time(), 3), 'session': session_id, 'step': step,
+                 'wall_ms': round(wall_ms, 3), 'rows': rows, 'bytes': nbytes}
+        with self._lock:
+            samples = self._samples.get(step)
+            if samples is None:
+                samples = self._samples[step] = np.zeros(self.window)
+            samples[self._counts.get(step, 0) % self.window] = wall_ms
+            self._counts[step] = self._counts.get(step, 0) + 1
+            if session_id in self._runs:
+                self._runs[session_id].append(entry)
+            flush = False
+            if self.log_path:
+                self._pending.append(entry)
+                flush = (len(self._pending) >= PERF_FLUSH_RECORDS
+                         or time.monotonic() - self._last_flush >= PERF_FLUSH_INTERVAL_S)
+        if flush:
+            self.flush()
+        return entry
+    
+    def flush(self):
+        """Append the buffered log records to log_path"""
+        # Lock file dipegang selama menulis supaya urutan batch terjaga; recorder hanya
+        # memegang lock sampel sebentar untuk mengambil buffer
+        with self._file_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                self._last_flush = time.monotonic()
+            if not pending:
+                return
+            try:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(''.join(json.dumps(entry) + '\n' for entry in pending))
+            except OSError as e:
+                logger.warning("Gagal menulis perf log %s: %s", self.log_path, e)
+    
+    def last_run(self, session_id):
+        with self._lock:
+            return list(self._runs.get(session_id, ()))
+    
+    def percentiles(self):
+        """{step: count, p50_ms, p95_ms, max_ms} over the last PERF_WINDOW samples per step"""
+        with self._lock:
+            windows = {step: np.sort(samples[:min(self._counts[step], self.window)])
+                       for step, samples in self._samples.items()}
+            counts = dict(self._counts)
+        return {
+            step: {
+                'count': counts[step],
+                'p50_ms': round(float(percentile(values, 50)), 3),
+                'p95_ms': round(float(percentile(values, 95)), 3),
+                'max_ms': round(float(values[-1]), 3),
+            }
+            for step, values in sorted(windows.items())
+        }
+
+@st.cache_resource
+def perf_recorder():
+    """The process-wide PerfRecorder (shared by all sessions)"""
+    recorder = PerfRecorder(PERF_LOG_PATH)
+    if recorder.log_path:
+        atexit.register(recorder.flush)
+    return recorder
+
+def _session_id():
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+def _measure(args, result):
+    """(rows, bytes) of a step: rows of the result or of the input frame, bytes produced"""
+    if isinstance(result, (bytes, bytearray)):
+        rows = len(args[0]) if args and isinstance(args[0], pd.DataFrame) else None
+        return rows, len(result)
+    if isinstance(result, pd.DataFrame):
+        return len(result), int(result.memory_usage(index=False).sum())
+    if isinstance(result, np.ndarray):
+        return len(result), int(result.nbytes)
+    if args and isinstance(args[0], pd.DataFrame):
+        return len(args[0]), None
+    return None, None
+
+@contextmanager
+def perf_step(step):
+    """Time a block; set info['rows'] / info['bytes'] inside it to record sizes"""
+    info = {}
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        perf_recorder().record(step, (time.perf_counter() - start) * 1000,
+                               info.get('rows'), info.get('bytes'), _session_id())
+
+def instrumented(step=None):
+    """Decorator form of perf_step; rows/bytes are taken from the arguments and result"""
+    def decorator(fn):
+        name = step or fn.__name__
+        
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with perf_step(name) as info:
+                result = fn(*args, **kwargs)
+                info['rows'], info['bytes'] = _measure(args, result)
+            return result
+        return wrapper
+    return decorator
+
 # ===== LOAD DATA =====
-@st.cache_data
-def load_data():
-    """Load data from Excel file"""
+# Sumber data: workbook utama di root + satu file per tahun/upload di folder data/
+# (xlsx atau csv, format kolom sama). Tahun yang muncul di beberapa file diambil
+# dari file terakhir (urut: root dulu, lalu data/ urut nama).
+ROOT_DATA_FILE = 'DATA PROJECT.xlsx'
+DATA_DIR = 'data'
+DATA_PATTERNS = ('*.xlsx', '*.csv')
+
+# Cache kolumnar (Arrow IPC) per file sumber: hasil cleaning + agregasi tiap file disimpan
+# sebagai partisi, manifest mencatat hash file -> partisi. Hanya file baru/berubah yang di-parse.
+# Naikkan CACHE_SCHEMA_VERSION setiap kali pipeline cleaning/agregasi berubah.
+CACHE_DIR = '.cache'
+PARTITION_DIR = os.path.join(CACHE_DIR, 'partitions')
+MANIFEST_PATH = os.path.join(CACHE_DIR, 'manifest.json')
+CACHE_SCHEMA_VERSION = '4'
+# Dataset gabungan semua partisi, satu file Arrow yang di-memory-map oleh setiap proses
+# (replika Streamlit di belakang load balancer): page cache OS dipakai bersama, tanpa
+# salinan per proses dan tanpa copy per cache hit
+SHARED_DATASET_PATH = os.path.join(CACHE_DIR, 'dataset.arrow')
+
+def find_data_files():
+    """Return every source file: the root workbook first, then data/ sorted by name"""
+    paths = [ROOT_DATA_FILE] if os.path.exists(ROOT_DATA_FILE) else []
+    paths += sorted(path for pattern in DATA_PATTERNS for path in glob.glob(os.path.join(DATA_DIR, pattern)))
+    if not paths:
+        raise FileNotFoundError(f"File data tidak ditemukan: {ROOT_DATA_FILE} atau {DATA_DIR}/*.xlsx")
+    return paths
+
+def file_sha256(path):
+    """SHA-256 of a file, read in 1 MB chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def source_fingerprint(path, sha256=None):
+    """Metadata identifying the source file a partition was built from"""
+    stat = os.stat(path)
+    return {
+        'schema_version': CACHE_SCHEMA_VERSION,
+        'source_sha256': sha256 or file_sha256(path),
+        'source_mtime': repr(stat.st_mtime),
+        'source_size': str(stat.st_size),
+    }
+
+# Validasi per baris: nama wilayah dinormalisasi sekali per nilai unik lewat tabel alias,
+# kode kelamin dipetakan ke L/P, baris tidak valid dihitung per alasan (bukan dropna diam-diam).
+REQUIRED_COLUMNS = ('tahun', 'kecamatan', 'kelurahan', 'kelamin', 'umur', 'jumlah')
+SEX_CODES = {
+    'L': 'L', 'LK': 'L', 'LAKI': 'L', 'LAKI-LAKI': 'L', 'LAKI LAKI': 'L', 'M': 'L', 'MALE': 'L', '1': 'L',
+    'P': 'P', 'PR': 'P', 'PEREMPUAN': 'P', 'WANITA': 'P', 'W': 'P', 'F': 'P', 'FEMALE': 'P', '2': 'P',
+}
+# Ejaan wilayah yang berbeda antar file/tahun -> nama kanonik (key: huruf besar, spasi tunggal)
+WILAYAH_ALIASES = {
+    'DADIMULYA': 'Dadi Mulya',
+}
+
+@dataclass
+class IngestReport:
+    """Row counts of one ingested source file"""
+    rows_read: int = 0
+    rows_accepted: int = 0
+    rejected: dict = field(default_factory=dict)  # alasan -> jumlah baris
+    aliased: dict = field(default_factory=dict)   # "nama asli -> kanonik" -> jumlah baris
+    
+    def reject(self, reason):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+def iter_source_rows(path):
+    """Yield raw row tuples (header first) without materializing the whole sheet"""
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            yield from csv.reader(f)
+        return
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
     try:
-        # Try production path first (root folder)
-        try:
-            df = pd.read_excel('DATA PROJECT.xlsx')
-        except FileNotFoundError:
-            # Fallback to local development path
-            df = pd.read_excel('data/DATA PROJECT.xlsx')
-        
-        df.columns = df.columns.str.lower().str.strip()
-        
-        df['tahun'] = df['tahun'].astype(str)
-        df['kecamatan'] = df['kecamatan'].str.strip().str.title()
-        df['kelurahan'] = df['kelurahan'].str.strip().str.title()
-        df['kelamin'] = df['kelamin'].str.strip().str.upper()
-        df['umur'] = pd.to_numeric(df['umur'], errors='coerce')
-        df['jumlah'] = pd.to_numeric(df['jumlah'], errors='coerce')
-        
-        # Remove rows with missing values
-        df = df.dropna()
-        
-        # STANDARDIZE: Convert umur >= 75 to 75
-        df.loc[df['umur'] >= 75, 'umur'] = 75
-        
-        # Aggregate data after standardization (karena banyak row umur yang jadi 75)
-        df = df.groupby(['tahun', 'kecamatan', 'kelurahan', 'kelamin', 'umur'], as_index=False)['jumlah'].sum()
-        
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+def parse_int(value):
+    """int from an Excel/CSV cell, or None if it is empty or not a whole number"""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else None
+
+def canonical_wilayah(value):
+    """(canonical kecamatan/kelurahan name or None if empty, whether an alias was applied)"""
+    key = ' '.join(str(value).split()).upper() if value is not None else ''
+    if not key:
+        return None, False
+    if key in WILAYAH_ALIASES:
+        return WILAYAH_ALIASES[key], True
+    return key.title(), False
+
+def parse_workbook(path, report=None):
+    """Stream, validate and aggregate one source file into the compact long-format frame"""
+    report = report if report is not None else IngestReport()
+    rows = iter_source_rows(path)
+    header = next(rows, None) or ()
+    columns = [str(c).strip().lower() if c is not None else '' for c in header]
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise ValueError(f"{path}: kolom wajib tidak ditemukan: {', '.join(missing)}")
+    positions = [columns.index(c) for c in REQUIRED_COLUMNS]
+    width = max(positions) + 1
+    
+    # Normalisasi string cukup sekali per nilai mentah unik
+    wilayah = functools.lru_cache(maxsize=None)(canonical_wilayah)
+    kec_codes, kel_codes = {}, {}
+    # Agregasi langsung per sel; key = satu int (tahun, kecamatan, kelurahan, kelamin, umur)
+    # sehingga memori sebanding jumlah sel unik, bukan jumlah baris file
+    totals = {}
+    
+    for row in rows:
+        if row is None or all(v is None or v == '' for v in row):
+            continue
+        report.rows_read += 1
+        row = tuple(row) + (None,) * (width - len(row))
+        tahun, kecamatan, kelurahan, kelamin, umur, jumlah = (row[i] for i in positions)
+        
+        tahun = parse_int(tahun)
+        if tahun is None or not 0 <= tahun < 1 << 15:
+            report.reject('tahun tidak valid')
+            continue
+        (kec, kec_alias), (kel, kel_alias) = wilayah(kecamatan), wilayah(kelurahan)
+        if kec is None or kel is None:
+            report.reject('kecamatan/kelurahan kosong')
+            continue
+        sex = SEX_CODES.get(str(kelamin).strip().upper()) if kelamin is not None else None
+        if sex is None:
+            report.reject('kelamin tidak dikenal')
+            continue
+        umur = parse_int(umur)
+        if umur is None or umur < 0:
+            report.reject('umur tidak valid')
+            continue
+        jumlah = parse_int(jumlah)
+        if jumlah is None or jumlah < 0:
+            report.reject('jumlah tidak valid')
+            continue
+        
+        for raw, name, aliased in ((kecamatan, kec, kec_alias), (kelurahan, kel, kel_alias)):
+            if aliased:
+                alias = f"{str(raw).strip()} -> {name}"
+                report.aliased[alias] = report.aliased.get(alias, 0) + 1
+        
+        # STANDARDIZE: umur >= 75 digabung ke 75
+        kec = kec_codes.setdefault(kec, len(kec_codes))
+        kel = kel_codes.setdefault(kel, len(kel_codes))
+        cell = ((((tahun << 20 | kec) << 20 | kel) << 1 | (sex == 'P')) << 7) | min(umur, MAX_AGE)
+        totals[cell] = totals.get(cell, 0) + jumlah
+        report.rows_accepted += 1
+    
+    if report.rejected:
+        logger.warning("%s: %d dari %d baris ditolak: %s", path,
+                       report.rows_read - report.rows_accepted, report.rows_read, report.rejected)
+    
+    cells = np.fromiter(totals.keys(), dtype=np.int64, count=len(totals))
+    jumlah = np.fromiter(totals.values(), dtype=np.int64, count=len(totals))
+    compact = _cells_frame(cells, jumlah, kec_codes, kel_codes)
+    if logger.isEnabledFor(logging.INFO):
+        before, after = memory_report(uncompacted_frame(compact), compact).loc['total', ['before', 'after']]
+        logger.info("%s: %d baris -> %d sel, frame %d -> %d bytes (%.1fx)", path, report.rows_accepted,
+                    len(compact), before, after, before / after if after else 0.0)
+    return compact
+
+def _ordered_codes(codes, names):
+    """Re-code first-seen codes to positions in the sorted names; returns (codes, categories)"""
+    categories = sorted(names)
+    rank = np.empty(len(names), dtype=np.int64)
+    rank[[names[c] for c in categories]] = np.arange(len(categories))
+    return rank[codes], categories
+
+def _cells_frame(cells, jumlah, kec_codes, kel_codes):
+    """Compact frame from packed cell keys, rows sorted like a groupby on the five columns"""
+    years, year_seen = np.unique(cells >> 48, return_inverse=True)
+    year_code, year_names = _ordered_codes(year_seen, {str(y): i for i, y in enumerate(years.tolist())})
+    kec, kec_names = _ordered_codes((cells >> 28) & 0xFFFFF, kec_codes)
+    kel, kel_names = _ordered_codes((cells >> 8) & 0xFFFFF, kel_codes)
+    sex = (cells >> 7) & 1
+    umur = cells & 0x7F
+    
+    order = np.lexsort((umur, sex, kel, kec, year_code))
+    frame = pd.DataFrame({
+        'tahun': pd.Categorical.from_codes(year_code[order], categories=year_names, ordered=True),
+        'kecamatan': pd.Categorical.from_codes(kec[order], categories=kec_names, ordered=True),
+        'kelurahan': pd.Categorical.from_codes(kel[order], categories=kel_names, ordered=True),
+        'kelamin': pd.Categorical.from_codes(sex[order], categories=list(SEXES), ordered=True),
+        'umur': umur[order].astype(np.uint8),
+    })
+    fits_uint32 = len(jumlah) == 0 or jumlah.max() <= np.iinfo(np.uint32).max
+    frame['jumlah'] = jumlah[order].astype(np.uint32 if fits_uint32 else np.int64)
+    return frame
+
+def compact_frame(df):
+    """Compact schema: categorical dimensions, uint8 umur, uint32 jumlah"""
+    compact = pd.DataFrame(index=pd.RangeIndex(len(df)))
+    for column in ('tahun', 'kecamatan', 'kelurahan', 'kelamin'):
+        # Kategori terurut -> filter dan groupby jadi compare kode integer (int8)
+        values = df[column].to_numpy()
+        compact[column] = pd.Categorical(values, categories=sorted(set(values)), ordered=True)
+    
+    jumlah = df['jumlah']
+    fits_uint32 = len(jumlah) == 0 or (jumlah.min() >= 0 and jumlah.max() <= np.iinfo(np.uint32).max)
+    compact['umur'] = df['umur'].to_numpy().astype(np.uint8)
+    compact['jumlah'] = jumlah.to_numpy().astype(np.uint32 if fits_uint32 else np.int64)
+    return compact
+
+def uncompacted_frame(df):
+    """The frame in the original schema (string columns, int64 umur/jumlah), for memory comparisons"""
+    wide = pd.DataFrame({column: df[column].astype(str) for column in ('tahun', 'kecamatan', 'kelurahan', 'kelamin')})
+    wide['umur'] = df['umur'].to_numpy().astype(np.int64)
+    wide['jumlah'] = df['jumlah'].to_numpy().astype(np.int64)
+    return wide
+
+def memory_report(before, after):
+    """Per-column deep memory usage (bytes) of two frames side by side"""
+    report = pd.DataFrame({
+        'before': before.memory_usage(deep=True, index=False),
+        'after': after.memory_usage(deep=True, index=False),
+    })
+    report.loc['total'] = report.sum()
+    report['ratio'] = report['before'] / report['after']
+    return report
+
+def read_cached_frame(cache_path, source_sha256):
+    """Read a memory-mapped partition, or None if missing, stale or unreadable"""
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with pa.memory_map(cache_path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            meta = {k.decode(): v.decode() for k, v in (reader.schema.metadata or {}).items()}
+            if meta.get('schema_version') != CACHE_SCHEMA_VERSION or meta.get('source_sha256') != source_sha256:
+                return None
+            return reader.read_all().to_pandas()
+    except (OSError, pa.ArrowException) as e:
+        logger.warning("Cache %s tidak bisa dibaca, rebuild dari sumber: %s", cache_path, e)
+        return None
+
+def write_cached_frame(df, cache_path, fingerprint):
+    """Write the cleaned frame as an Arrow IPC file with the source fingerprint as metadata; True if written"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **fingerprint})
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        # Atomic replace supaya proses lain tidak pernah membaca file setengah jadi
+        os.replace(tmp_path, cache_path)
+        return True
+    except OSError as e:
+        # Filesystem read-only tidak fatal, dashboard tetap jalan tanpa cache
+        logger.warning("Gagal menulis cache %s: %s", cache_path, e)
+        return False
+
+def partition_path(sha256):
+    return os.path.join(PARTITION_DIR, f'{sha256[:16]}.arrow')
+
+def parse_partition(path, sha256):
+    """Parse one source file and write its partition"""
+    report = IngestReport()
+    df = parse_workbook(path, report)
+    write_cached_frame(df, partition_path(sha256), source_fingerprint(path, sha256))
+    return df, asdict(report)
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            manifest = json.load(f)
+        if manifest.get('schema_version') == CACHE_SCHEMA_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {'schema_version': CACHE_SCHEMA_VERSION, 'files': {}}
+
+def save_manifest(manifest):
+    tmp_path = f"{MANIFEST_PATH}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, MANIFEST_PATH)
+    except OSError as e:
+        logger.warning("Gagal menulis manifest %s: %s", MANIFEST_PATH, e)
+
+def parse_partitions(jobs, workers=1):
+    """Parse (path, sha256) jobs, in a spawn process pool when workers > 1; returns {path: (frame, report)}
+
+    Di server Streamlit selalu berurutan: fork proses yang multi-thread (Tornado + script
+    runner) bisa deadlock, dan worker tidak bisa mengimport modul __main__ palsu streamlit.
+    Parse paralel hanya dari skrip offline (prepare_data.py), yang mengimport modul ini.
+    """
+    workers = min(len(jobs), workers)
+    if workers > 1:
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {path: pool.submit(parse_partition, path, sha) for path, sha in jobs}
+            return {path: future.result() for path, future in futures.items()}
+    return {path: parse_partition(path, sha) for path, sha in jobs}
+
+def source_entries(paths, manifest):
+    """Manifest entry (sha256, mtime, size, report) per source file, hashing only changed files"""
+    entries = {}
+    for path in paths:
+        stat = os.stat(path)
+        entry = manifest['files'].get(path)
+        # mtime + size sama -> anggap file tidak berubah, tanpa hashing
+        if not (entry and entry['mtime'] == repr(stat.st_mtime) and entry['size'] == stat.st_size):
+            sha256 = file_sha256(path)
+            report = entry.get('report') if entry and entry['sha256'] == sha256 else None
+            entry = {'sha256': sha256, 'mtime': repr(stat.st_mtime), 'size': stat.st_size, 'report': report}
+        entries[path] = entry
+    return entries
+
+def load_partitions(paths, manifest=None, entries=None, workers=1):
+    """Frames for every source file, parsing only new or changed files"""
+    manifest = manifest if manifest is not None else load_manifest()
+    entries = dict(entries if entries is not None else source_entries(paths, manifest))
+    previous = set(manifest['files'])
+    frames, jobs = {}, []
+    
+    for path in paths:
+        entry = entries[path]
+        df = read_cached_frame(partition_path(entry['sha256']), entry['sha256'])
+        if df is None:
+            jobs.append((path, entry['sha256']))
+        else:
+            frames[path] = df
+    
+    if jobs:
+        logger.info("Parse %d file sumber baru/berubah: %s", len(jobs), [path for path, _ in jobs])
+        for path, (df, report) in parse_partitions(jobs, workers).items():
+            frames[path] = df
+            entries[path] = {**entries[path], 'report': report}
+    
+    manifest['files'] = {path: {**entry, 'partition': partition_path(entry['sha256'])}
+                         for path, entry in entries.items()}
+    if jobs or set(manifest['files']) != previous:
+        save_manifest(manifest)
+        remove_stale_partitions(manifest)
+    
+    return [frames[path] for path in paths]
+
+def remove_stale_partitions(manifest):
+    """Delete partition files no longer referenced by the manifest"""
+    referenced = {os.path.abspath(entry['partition']) for entry in manifest['files'].values()}
+    for path in glob.glob(os.path.join(PARTITION_DIR, '*.arrow')):
+        if os.path.abspath(path) not in referenced:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def combine_partitions(frames):
+    """Concatenate partitions; a year present in several files comes from the last one"""
+    owner = {}
+    for i, df in enumerate(frames):
+        for year in df['tahun'].unique():
+            if year in owner:
+                logger.warning("Tahun %s ada di beberapa file sumber, dipakai file terakhir", year)
+            owner[year] = i
+    parts = [df[df['tahun'].isin([y for y, i in owner.items() if i == idx])]
+             for idx, df in enumerate(frames)]
+    if len(parts) == 1:
+        return parts[0].reset_index(drop=True)
+    combined = pd.concat([part.astype({c: str for c in ('tahun', 'kecamatan', 'kelurahan', 'kelamin')})
+                          for part in parts], ignore_index=True)
+    return compact_frame(combined)
+
+def dataset_key(entries):
+    """Identity of the combined dataset: cache schema + every source file's hash, in order"""
+    digest = hashlib.sha256(CACHE_SCHEMA_VERSION.encode())
+    for path, entry in entries.items():
+        digest.update(f"\0{path}\0{entry['sha256']}".encode())
+    return digest.hexdigest()
+
+def read_shared_dataset(key):
+    """Zero-copy read-only frame over the memory-mapped dataset file, or None if missing or stale"""
+    if not os.path.exists(SHARED_DATASET_PATH):
+        return None
+    try:
+        # Mapping tetap hidup selama buffer Arrow dipakai frame, jadi file tidak ditutup di sini
+        reader = pa.ipc.open_file(pa.memory_map(SHARED_DATASET_PATH, 'r'))
+        meta = {k.decode(): v.decode() for k, v in (reader.schema.metadata or {}).items()}
+        if meta.get('schema_version') != CACHE_SCHEMA_VERSION or meta.get('dataset_key') != key:
+            return None
+        # split_blocks: tiap kolom (kode kategori, umur, jumlah) jadi view read-only ke
+        # halaman yang di-map, bukan blok pandas hasil konsolidasi (copy)
+        return reader.read_all().to_pandas(split_blocks=True)
+    except (OSError, pa.ArrowException) as e:
+        logger.warning("Dataset %s tidak bisa dibaca, dibangun ulang: %s", SHARED_DATASET_PATH, e)
+        return None
+
+def load_dataset(paths, workers=1):
+    """Combined dataset, memory-mapped from SHARED_DATASET_PATH; rebuilt from the partitions when stale"""
+    manifest = load_manifest()
+    entries = source_entries(paths, manifest)
+    key = dataset_key(entries)
+    df = read_shared_dataset(key)
+    if df is not None:
         return df
-    except Exception as e:
+    df = combine_partitions(load_partitions(paths, manifest, entries, workers))
+    if write_cached_frame(df, SHARED_DATASET_PATH, {'schema_version': CACHE_SCHEMA_VERSION, 'dataset_key': key}):
+        # Baca ulang lewat memory map supaya proses yang membangun juga memakai halaman bersama
+        shared = read_shared_dataset(key)
+        if shared is not None:
+            return shared
+    return df
+
+@st.cache_resource
+def load_data():
+    """Load the shared read-only dataset once per process, re-parsing only new or changed files
+
+    cache_resource, bukan cache_data: setiap rerun dapat frame yang sama (tanpa pickle/copy
+    per hit). Frame dipakai bersama semua session, jadi jangan diubah in-place.
+    """
+    try:
+        return load_dataset(find_data_files())
+    except FileNotFoundError as e:
         st.error(f"Error loading data: {e}")
         st.info("Pastikan file 'DATA PROJECT.xlsx' ada di folder yang sama dengan dashboard_samarinda.py")
+    except ValueError as e:
+        # Struktur file salah (kolom wajib hilang); baris tidak valid tidak sampai ke sini
+        st.error(f"Format data tidak valid: {e}")
+        st.info(f"Kolom wajib: {', '.join(REQUIRED_COLUMNS)}")
+    except Exception as e:
+        logger.exception("Gagal memuat data")
+        st.error(f"Error loading data: {type(e).__name__}: {e}")
+    return None
+    
+# ===== DATA CUBE =====
+# Umur sudah di-standardize ke 0..75 dan kelamin ke L/P, jadi data muat di array padat
+# [tahun, wilayah, kelamin, umur]. Sumbu wilayah = pasangan (kecamatan, kelurahan)
+# terurut, jadi kelurahan satu kecamatan selalu satu rentang kontigu. Filter jadi
+# slicing, total range umur jadi dua lookup pada cumulative sum di sumbu umur.
+MAX_AGE = 75
+SEXES = ('L', 'P')
+
+@dataclass(frozen=True, eq=False)
+class WilayahHierarchy:
+    """Kecamatan -> sorted kelurahan of one year, behind the dependent wilayah dropdowns"""
+    kecamatan: tuple      # kecamatan yang punya data di tahun ini, terurut
+    kelurahan: dict       # kecamatan -> tuple kelurahan terurut
+    all_kelurahan: tuple  # semua kelurahan tahun ini, terurut
+
+    def kelurahan_options(self, kecamatan=()):
+        """Sorted kelurahan under the selected kecamatan (all kelurahan when none selected)"""
+        if not kecamatan:
+            return self.all_kelurahan
+        if len(kecamatan) == 1:
+            return self.kelurahan.get(kecamatan[0], ())
+        return tuple(sorted({k for kec in kecamatan for k in self.kelurahan.get(kec, ())}))
+
+@dataclass(frozen=True, eq=False)
+class PopulationCube:
+    """Dense population counts indexed by [tahun, wilayah, kelamin, umur]"""
+    years: tuple
+    kecamatan: tuple
+    kelurahan: tuple                # nama kelurahan per posisi wilayah
+    year_code: dict
+    kecamatan_code: dict
+    wilayah_kecamatan: np.ndarray   # kode kecamatan per posisi wilayah (tidak turun)
+    kecamatan_offsets: np.ndarray   # kecamatan i = wilayah [offsets[i], offsets[i + 1])
+    hierarchy: dict                 # tahun -> WilayahHierarchy
+    counts: np.ndarray    # int64 [tahun, wilayah, kelamin, umur]
+    cum_age: np.ndarray   # cumulative sum of counts over the umur axis
+    present: np.ndarray   # bool [tahun, wilayah], wilayah yang punya baris data
+    year_totals: np.ndarray
+    area_cum_age: np.ndarray  # cum_age dijumlah per kelamin: [tahun, wilayah, umur]
+    version: str              # hash isi cube, bagian dari key cache figure
+
+@dataclass(frozen=True, eq=False)
+class CubeSelection:
+    """View of one year of the cube, narrowed by wilayah and age range"""
+    year: str
+    filter_kecamatan: tuple
+    filter_kelurahan: tuple
+    kecamatan: tuple              # nama kecamatan cube, index = kode kecamatan
+    kecamatan_codes: np.ndarray   # kode kecamatan per wilayah terpilih (tidak turun)
+    kelurahan: tuple              # nama kelurahan per wilayah terpilih
+    age_range: tuple
+    counts: np.ndarray        # [wilayah, kelamin, umur in age_range]
+    cum_age: np.ndarray       # [wilayah, kelamin, umur 0..75]
+    present: np.ndarray       # [wilayah]
+    range_totals: np.ndarray  # [wilayah, kelamin] summed over age_range
+
+    def by_kecamatan(self, values):
+        """Sum values [wilayah, ...] per kecamatan; returns (kecamatan codes, sums)"""
+        codes = self.kecamatan_codes
+        if len(codes) == 0:
+            return codes, values[:0]
+        # Wilayah terurut per kecamatan, jadi tiap kecamatan satu run berurutan
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        return codes[starts], np.add.reduceat(values, starts, axis=0)
+
+    def total(self):
+        return int(self.range_totals.sum())
+
+    def sex_totals(self):
+        """Totals per kelamin, ordered as SEXES"""
+        return self.range_totals.sum(axis=0)
+
+    def age_band_totals(self, bounds):
+        """[kelamin, band] totals for (lo, hi) age bands, intersected with the age range"""
+        cum = self.cum_age.sum(axis=0)  # [kelamin, umur 0..75]
+        lo = np.maximum([band[0] for band in bounds], self.age_range[0])
+        hi = np.minimum([band[1] for band in bounds], self.age_range[1])
+        # Dua lookup per band pada prefix sum umur, tanpa scan per umur
+        totals = cum[:, hi] - np.where(lo > 0, cum[:, np.maximum(lo - 1, 0)], 0)
+        return np.where(lo <= hi, totals, 0)
+
+    def kecamatan_sex_frame(self):
+        """Long frame (kecamatan, kelamin, jumlah) for kecamatan in the selection"""
+        codes, totals = self.by_kecamatan(self.range_totals)
+        idx = np.flatnonzero(self.by_kecamatan(self.present)[1])
+        return _wilayah_sex_frame('kecamatan', [self.kecamatan[c] for c in codes], idx, totals)
+
+    def sex_frame(self):
+        """Long frame (kelamin, jumlah) for kelamin with population in the selection"""
+        totals = self.sex_totals()
+        idx = np.flatnonzero(totals > 0)
+        return pd.DataFrame({'kelamin': [SEXES[i] for i in idx], 'jumlah': totals[idx]})
+
+    def kelurahan_ranking(self):
+        """Per-kelurahan [kelamin] totals for every kelurahan in the selection"""
+        idx = np.flatnonzero(self.present)
+        sex_totals = self.range_totals[idx]  # [kelurahan, kelamin]
+        return KelurahanRanking(
+            kecamatan=tuple(self.kecamatan[c] for c in self.kecamatan_codes[idx]),
+            kelurahan=tuple(self.kelurahan[i] for i in idx),
+            sex_totals=sex_totals,
+            totals=sex_totals.sum(axis=1),
+        )
+
+@dataclass(frozen=True, eq=False)
+class KelurahanRanking:
+    """Kelurahan totals of one selection, ranked on demand (descending, ties in wilayah order)"""
+    kecamatan: tuple
+    kelurahan: tuple
+    sex_totals: np.ndarray  # [kelurahan, kelamin]
+    totals: np.ndarray
+    
+    def top(self, n):
+        """Indices of the n largest kelurahan, largest first, without sorting the rest"""
+        n = min(n, len(self.totals))
+        if n == 0:
+            return np.empty(0, dtype=np.intp)
+        cutoff = self.totals[np.argpartition(-self.totals, n - 1)[n - 1]]
+        # argpartition memilih sembarang di antara nilai yang sama di batas top N;
+        # yang seri dengan batas diambil ulang dalam urutan wilayah
+        above = np.flatnonzero(self.totals > cutoff)
+        idx = np.concatenate([above, np.flatnonzero(self.totals == cutoff)[:n - len(above)]])
+        return idx[np.lexsort((idx, -self.totals[idx]))]
+    
+    @functools.cached_property
+    def order(self):
+        """Indices of every kelurahan, largest first"""
+        return self.top(len(self.totals))
+
+def _wilayah_sex_frame(column, names, idx, totals):
+    """Long frame (column, kelamin, jumlah) from a [wilayah, kelamin] matrix"""
+    return pd.DataFrame({
+        column: np.repeat([names[i] for i in idx], len(SEXES)),
+        'kelamin': np.tile(SEXES, len(idx)),
+        'jumlah': totals[idx].ravel(),
+    })
+
+def build_hierarchy(years, kecamatan, kelurahan, wilayah_kecamatan, present):
+    """Per-year kecamatan -> sorted kelurahan index from the cube's wilayah axis"""
+    hierarchy = {}
+    for year, year_present in zip(years, present):
+        children = {}
+        # Sumbu wilayah sudah terurut (kecamatan, kelurahan): urutan insert = urutan abjad
+        for i in np.flatnonzero(year_present):
+            children.setdefault(kecamatan[wilayah_kecamatan[i]], []).append(kelurahan[i])
+        hierarchy[year] = WilayahHierarchy(
+            kecamatan=tuple(children),
+            kelurahan={kec: tuple(names) for kec, names in children.items()},
+            all_kelurahan=tuple(sorted({name for names in children.values() for name in names})),
+        )
+    return hierarchy
+
+def build_cube(df):
+    """Build the population cube and its wilayah hierarchy from the long-format frame"""
+    years = tuple(sorted(df['tahun'].unique()))
+    kecamatan = tuple(sorted(df['kecamatan'].unique()))
+    kelurahan_names = tuple(sorted(df['kelurahan'].unique()))
+    
+    y = pd.Categorical(df['tahun'], categories=years).codes
+    k = pd.Categorical(df['kecamatan'], categories=kecamatan).codes
+    l = pd.Categorical(df['kelurahan'], categories=kelurahan_names).codes
+    s = pd.Categorical(df['kelamin'], categories=SEXES).codes
+    a = df['umur'].to_numpy().astype(np.intp)
+    
+    # Hanya pasangan (kecamatan, kelurahan) yang ada di data yang dapat slot wilayah;
+    # np.unique mengurutkannya per kecamatan lalu kelurahan
+    pairs, w = np.unique(k.astype(np.int64) * len(kelurahan_names) + l, return_inverse=True)
+    wilayah_kecamatan = (pairs // len(kelurahan_names)).astype(np.intp)
+    kelurahan = tuple(kelurahan_names[i] for i in pairs % len(kelurahan_names))
+    kecamatan_offsets = np.searchsorted(wilayah_kecamatan, np.arange(len(kecamatan) + 1))
+    
+    # Kode kelamin di luar L/P tidak punya slot di cube
+    valid = s >= 0
+    
+    counts = np.zeros((len(years), len(pairs), len(SEXES), MAX_AGE + 1), dtype=np.int64)
+    np.add.at(counts, (y[valid], w[valid], s[valid], a[valid]), df['jumlah'].to_numpy()[valid])
+    
+    present = np.zeros(counts.shape[:2], dtype=bool)
+    present[y, w] = True
+    
+    cum_age = np.cumsum(counts, axis=-1)
+    year_totals = counts.sum(axis=(1, 2, 3))
+    area_cum_age = cum_age.sum(axis=2)
+    
+    # Cube dipakai bersama semua session, jadi kunci supaya read-only
+    for arr in (counts, cum_age, present, year_totals, area_cum_age, wilayah_kecamatan, kecamatan_offsets):
+        arr.flags.writeable = False
+    
+    return PopulationCube(
+        years=years,
+        kecamatan=kecamatan,
+        kelurahan=kelurahan,
+        year_code={v: i for i, v in enumerate(years)},
+        kecamatan_code={v: i for i, v in enumerate(kecamatan)},
+        wilayah_kecamatan=wilayah_kecamatan,
+        kecamatan_offsets=kecamatan_offsets,
+        hierarchy=build_hierarchy(years, kecamatan, kelurahan, wilayah_kecamatan, present),
+        counts=counts,
+        cum_age=cum_age,
+        present=present,
+        year_totals=year_totals,
+        area_cum_age=area_cum_age,
+        version=hashlib.sha1(counts.tobytes()).hexdigest()[:12],
+    )
+
+def area_index(cube, kecamatan=(), kelurahan=()):
+    """Wilayah-axis index for a kecamatan/kelurahan multi-select (kosong = semua)
+
+    Satu kecamatan (atau rentang kontigu lain) jadi slice, jadi hasil select tetap view
+    """
+    if not kecamatan and not kelurahan:
+        return slice(None)
+    if kecamatan:
+        offsets = cube.kecamatan_offsets
+        idx = np.concatenate([np.arange(offsets[c], offsets[c + 1])
+                              for c in sorted(cube.kecamatan_code[kec] for kec in kecamatan)])
+    else:
+        idx = np.arange(len(cube.kelurahan))
+    if kelurahan:
+        wanted = set(kelurahan)
+        idx = idx[[cube.kelurahan[i] in wanted for i in idx]]
+    if len(idx) and idx[-1] - idx[0] + 1 == len(idx):
+        return slice(int(idx[0]), int(idx[-1]) + 1)
+    return idx
+
+def _take(names, idx):
+    """names[idx] for a tuple and a slice or index array"""
+    return names[idx] if isinstance(idx, slice) else tuple(names[i] for i in idx)
+
+@instrumented()
+def select_cube(cube, year, kecamatan=(), kelurahan=(), age_range=(0, MAX_AGE)):
+    """Slice one year of the cube by kecamatan, kelurahan and age range"""
+    y = cube.year_code[year]
+    w = area_index(cube, kecamatan, kelurahan)
+    
+    min_age, max_age = age_range
+    cum_age = cube.cum_age[y, w]
+    range_totals = cum_age[..., max_age]
+    if min_age > 0:
+        range_totals = range_totals - cum_age[..., min_age - 1]
+    
+    return CubeSelection(
+        year=year,
+        filter_kecamatan=kecamatan,
+        filter_kelurahan=kelurahan,
+        kecamatan=cube.kecamatan,
+        kecamatan_codes=cube.wilayah_kecamatan[w],
+        kelurahan=_take(cube.kelurahan, w),
+        age_range=(min_age, max_age),
+        counts=cube.counts[y, w, :, min_age:max_age + 1],
+        cum_age=cum_age,
+        present=cube.present[y, w],
+        range_totals=range_totals,
+    )
+
+@functools.lru_cache(maxsize=256)
+def area_year_totals(cube, kecamatan=(), kelurahan=(), age_range=(0, MAX_AGE)):
+    """Per-year totals and presence for one wilayah + age filter, as (totals, present) tuples"""
+    w = area_index(cube, kecamatan, kelurahan)
+    min_age, max_age = age_range
+    cum = cube.area_cum_age[:, w]
+    totals = cum[..., max_age]
+    if min_age > 0:
+        totals = totals - cum[..., min_age - 1]
+    present = cube.present[:, w].any(axis=1)
+    return tuple(int(v) for v in totals.sum(axis=1)), tuple(bool(v) for v in present)
+
+def year_sex_frame(cube):
+    """Long frame (tahun, kelamin, jumlah) across all years"""
+    totals = cube.counts.sum(axis=(1, 3))  # [tahun, kelamin]
+    return pd.DataFrame({
+        'tahun': np.repeat(cube.years, len(SEXES)),
+        'kelamin': np.tile(SEXES, len(cube.years)),
+        'jumlah': totals.ravel(),
+    })
+
+@dataclass(frozen=True, eq=False)
+class YearSummary:
+    """Per-year totals behind the Perbandingan Multi Tahun mode, precomputed from the cube"""
+    years: tuple
+    kecamatan: tuple
+    kelurahan: tuple
+    year_code: dict
+    year_sex: np.ndarray           # [tahun, kelamin]
+    kecamatan_sex: np.ndarray      # [tahun, kecamatan, kelamin]
+    kelurahan_sex: np.ndarray      # [tahun, kelurahan, kelamin]
+    kecamatan_present: np.ndarray  # bool [tahun, kecamatan]
+    kelurahan_present: np.ndarray  # bool [tahun, kelurahan]
+    kelurahan_kecamatan: tuple     # kecamatan induk tiap kelurahan
+
+    def year_index(self, years):
+        return np.array([self.year_code[y] for y in years], dtype=np.intp)
+
+    def year_sex_frame(self, years):
+        """Long frame (tahun, kelamin, jumlah) for the given years"""
+        totals = self.year_sex[self.year_index(years)]
+        return pd.DataFrame({
+            'tahun': np.repeat(years, len(SEXES)),
+            'kelamin': np.tile(SEXES, len(years)),
+            'jumlah': totals.ravel(),
+        })
+
+def build_year_summary(cube):
+    """Sum the cube down to year x sex, year x kecamatan and year x kelurahan"""
+    wilayah_sex = cube.counts.sum(axis=3)  # [tahun, wilayah, kelamin]
+    starts = cube.kecamatan_offsets[:-1]
+    return YearSummary(
+        years=cube.years,
+        kecamatan=cube.kecamatan,
+        kelurahan=cube.kelurahan,
+        year_code=cube.year_code,
+        year_sex=wilayah_sex.sum(axis=1),
+        kecamatan_sex=np.add.reduceat(wilayah_sex, starts, axis=1),
+        kelurahan_sex=wilayah_sex,
+        kecamatan_present=np.logical_or.reduceat(cube.present, starts, axis=1),
+        kelurahan_present=cube.present,
+        kelurahan_kecamatan=tuple(cube.kecamatan[c] for c in cube.wilayah_kecamatan),
+    )
+
+@st.cache_resource
+def load_year_summary():
+    """Year summaries for the comparison mode, built once per process"""
+    cube = load_cube()
+    if cube is None:
         return None
+    return build_year_summary(cube)
+
+@st.cache_resource
+def load_cube():
+    """Build the population cube once per process (shared read-only across sessions)"""
+    df = load_data()
+    if df is None:
+        return None
+    return build_cube(df)
+
+@instrumented()
+def filter_mask(df, year, kecamatan=(), kelurahan=(), age_range=(0, MAX_AGE)):
+    """Boolean row mask for the raw data table, in one combined mask"""
+    mask = (df['tahun'] == year) & df['umur'].between(age_range[0], age_range[1])
+    if kecamatan or kelurahan:
+        # Multi-select wilayah: satu lookup [kode kecamatan, kode kelurahan] per baris,
+        # bukan isin berantai per kolom
+        kec, kel = df['kecamatan'].cat, df['kelurahan'].cat
+        keep = np.ones((len(kec.categories), len(kel.categories)), dtype=bool)
+        if kecamatan:
+            keep[~kec.categories.isin(kecamatan)] = False
+        if kelurahan:
+            keep[:, ~kel.categories.isin(kelurahan)] = False
+        mask &= keep[kec.codes.to_numpy(), kel.codes.to_numpy()]
+    return mask.to_numpy()
+
+def filter_frame(df, year, kecamatan=(), kelurahan=(), age_range=(0, MAX_AGE)):
+    """Row-level filter for the raw data table"""
+    return df[filter_mask(df, year, kecamatan, kelurahan, age_range)]
+
+# ===== SUMMARY METRICS =====
+@dataclass(frozen=True)
+class SummaryMetrics:
+    """All KPI values behind the Ringkasan Data cards"""
+    total: int
+    has_previous: bool
+    growth: int
+    growth_pct: float
+    usia_produktif: int
+    pct_produktif: float
+    rasio_dependensi: float
+    kecamatan_ranking: tuple  # ((kecamatan, total), ...) urut total terbesar
+    total_male: int
+    total_female: int
+    sex_ratio: Optional[float]
+    trend_years: tuple
+    trend_totals: tuple
+    growth_years: tuple
+    growth_series: tuple  # % pertumbuhan per tahun, None kalau tahun sebelumnya tidak ada
+
+    @property
+    def kecamatan_terbesar(self):
+        return self.kecamatan_ranking[0] if self.kecamatan_ranking else ('-', 0)
+
+    @property
+    def top3_kecamatan(self):
+        return self.kecamatan_ranking[:3]
+
+@instrumented()
+def compute_summary(selection, cube):
+    """Compute every summary KPI from one reduction of the selection"""
+    # Satu kali reduksi ke [kecamatan, kelamin, umur] (prefix sum umur); kecamatan
+    # jadi group key, semua KPI diturunkan dari blok kecil ini
+    kec_codes, cum = selection.by_kecamatan(selection.cum_age)
+    min_age, max_age = selection.age_range
+    
+    def band(lo, hi):
+        lo, hi = max(lo, min_age), min(hi, max_age)
+        if lo > hi:
+            return np.zeros(cum.shape[:2], dtype=cum.dtype)
+        return cum[..., hi] - (cum[..., lo - 1] if lo > 0 else 0)
+    
+    totals = band(0, MAX_AGE)   # [kecamatan, kelamin]
+    total = int(totals.sum())
+    usia_produktif = int(band(15, 64).sum())
+    dependents = int(band(0, 14).sum() + band(65, MAX_AGE).sum())
+    
+    # Pertumbuhan vs tahun sebelumnya dengan filter yang sama (wilayah + umur)
+    year_totals, year_present = area_year_totals(
+        cube, selection.filter_kecamatan, selection.filter_kelurahan, selection.age_range
+    )
+    growth_series = tuple(
+        (year_totals[i] - year_totals[i - 1]) / year_totals[i - 1] * 100
+        if i > 0 and year_present[i - 1] and year_totals[i - 1] > 0 else None
+        for i in range(len(year_totals))
+    )
+    y = cube.year_code[selection.year]
+    has_previous = growth_series[y] is not None
+    growth = total - year_totals[y - 1] if has_previous else 0
+    growth_pct = growth_series[y] if has_previous else 0
+    
+    kec_present = np.flatnonzero(selection.by_kecamatan(selection.present)[1])
+    kec_totals = totals.sum(axis=1)[kec_present]
+    order = np.argsort(-kec_totals, kind='stable')
+    
+    total_male, total_female = (int(v) for v in totals.sum(axis=0))
+    
+    return SummaryMetrics(
+        total=total,
+        has_previous=has_previous,
+        growth=growth,
+        growth_pct=growth_pct,
+        usia_produktif=usia_produktif,
+        pct_produktif=(usia_produktif / total * 100) if total > 0 else 0,
+        rasio_dependensi=(dependents / usia_produktif * 100) if usia_produktif > 0 else 0,
+        kecamatan_ranking=tuple((selection.kecamatan[kec_codes[kec_present[i]]], int(kec_totals[i])) for i in order),
+        total_male=total_male,
+        total_female=total_female,
+        sex_ratio=(total_male / total_female * 100) if total_female > 0 else None,
+        # Mini sparkline untuk trend total (3 tahun terakhir)
+        trend_years=cube.years[-3:],
+        trend_totals=year_totals[-3:],
+        growth_years=cube.years,
+        growth_series=growth_series,
+    )
     
 def format_number(num):
     """Format number with thousand separator"""
     return f"{num:,.0f}"
 
-def create_population_pyramid(df_filtered):
-    """Create population pyramid chart with age groups"""
-    # Create age groups
-    df_pyramid = df_filtered.copy()
-    
-    # Define age groups (updated untuk data yang sudah standardized ke 75+)
-    bins = [0, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60, 65, 70, 75, 150]
-    labels = ['0-4', '5-9', '10-14', '15-19', '20-24', '25-29', '30-34', '35-39', 
-              '40-44', '45-49', '50-54', '55-59', '60-64', '65-69', '70-74', '75+']
-    
-    df_pyramid['age_group'] = pd.cut(df_pyramid['umur'], bins=bins, labels=labels, right=False)
-    
-    # Aggregate by age group and gender
-    pyramid_data = df_pyramid.groupby(['age_group', 'kelamin'])['jumlah'].sum().reset_index()
-    
-    # Separate male and female
-    male_data = pyramid_data[pyramid_data['kelamin'] == 'L'].copy()
-    female_data = pyramid_data[pyramid_data['kelamin'] == 'P'].copy()
-    
-    # Ensure all age groups are present
-    all_groups = pd.DataFrame({'age_group': labels})
-    male_data = all_groups.merge(male_data, on='age_group', how='left').fillna(0)
-    female_data = all_groups.merge(female_data, on='age_group', how='left').fillna(0)
-    
-    # Make male values negative for left side
-    male_data['jumlah_display'] = -male_data['jumlah']
-    
-    fig = go.Figure()
-    
-    fig.add_trace(go.Bar(
-        y=male_data['age_group'],
-        x=male_data['jumlah_display'],
-        name='Male',
-        orientation='h',
-        marker=dict(color='#3498db'),
-        text=male_data['jumlah'].apply(lambda x: f'{x:,.0f}' if x > 0 else ''),
-        textposition='inside',
-        hovertemplate='<b>%{y}</b><br>Male: %{customdata:,.0f}<extra></extra>',
-        customdata=male_data['jumlah']
-    ))
-    
-    fig.add_trace(go.Bar(
-        y=female_data['age_group'],
-        x=female_data['jumlah'],
-        name='Female',
-        orientation='h',
-        marker=dict(color='#e91e63'),
-        text=female_data['jumlah'].apply(lambda x: f'{x:,.0f}' if x > 0 else ''),
-        textposition='inside',
-        hovertemplate='<b>%{y}</b><br>Female: %{x:,.0f}<extra></extra>'
-    ))
-    
-    fig.update_layout(
-        title='Population Pyramid by Age Group and Gender',
-        barmode='relative',
-        height=600,
-        xaxis=dict(
-            title='Population',
-            tickformat=',d',
-            tickvals=[-40000, -30000, -20000, -10000, 0, 10000, 20000, 30000, 40000],
-            ticktext=['40K', '30K', '20K', '10K', '0', '10K', '20K', '30K', '40K']
-        ),
-        yaxis=dict(
-            title='Age Group',
-            # Normal order: 0-4 di bawah, 75+ di atas
-            categoryorder='array',
-            categoryarray=labels  # Tidak di-reverse
-        ),
-        hovermode='y unified',
-        showlegend=True,
-        bargap=0.1
-    )
+# Kelompok umur: (umur awal, umur akhir) inklusif; kelompok terakhir terbuka (75+)
+def age_groups(width):
+    """Consecutive width-year age groups from 0, the last one open-ended up to MAX_AGE"""
+    bounds = [(lo, min(lo + width - 1, MAX_AGE)) for lo in range(0, MAX_AGE + 1, width)]
+    bounds[-1] = (bounds[-1][0], MAX_AGE)
+    return tuple(bounds)
+
+def age_label(lo, hi):
+    return f'{lo}+' if hi == MAX_AGE else f'{lo}-{hi}'
+
+AGE_GROUPINGS = {
+    'BPS 5 tahun': age_groups(5),
+    'BPS 10 tahun': age_groups(10),
+}
+AGE_GROUPING_DEFAULT = 'BPS 5 tahun'
+# Kelompok umur bernama di tabel Kelompok Umur (ditambah satu kelompok kustom dari slider)
+AGE_BANDS = {
+    'Balita': (0, 4),
+    'Usia Sekolah': (7, 18),
+    'Pemilih': (17, MAX_AGE),
+    'Usia Produktif': (15, 64),
+    'Lansia': (60, MAX_AGE),
+}
+CUSTOM_AGE_BAND_DEFAULT = (15, 24)
+
+def format_counts(values):
+    """Thousand-separated labels for an int array, blank where the value is 0"""
+    labels = pd.Series(values).map('{:,}'.format).to_numpy(dtype=object)
+    labels[values <= 0] = ''
+    return labels
+
+def abbreviate_number(num):
+    """Short tick label: 40000 -> 40K, 1500000 -> 1.5M"""
+    num = abs(num)
+    if num >= 1_000_000:
+        return f'{num / 1_000_000:g}M'
+    if num >= 1_000:
+        return f'{num / 1_000:g}K'
+    return f'{num:g}'
+
+def symmetric_ticks(max_value, target=4):
+    """Nice tick values/labels for an axis spanning -max_value..max_value"""
+    if max_value <= 0:
+        return [0], ['0']
+    raw_step = max_value / target
+    magnitude = 10 ** np.floor(np.log10(raw_step))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw_step)
+    positive = step * np.arange(1, int(np.ceil(max_value / step)) + 1)
+    tickvals = np.concatenate([-positive[::-1], [0], positive])
+    if np.all(tickvals == np.round(tickvals)):
+        tickvals = tickvals.astype(np.int64)
+    return tickvals.tolist(), [abbreviate_number(v) for v in tickvals]
+
+# ===== FIGURE SPECS =====
+# Builder chart menghasilkan dict figure (data + layout dalam bentuk kanonik plotly)
+# langsung dari array, tanpa validasi graph_objects. Dict ini yang diserialisasi ke
+# cache figure; create_* membungkusnya jadi go.Figure tervalidasi untuk pemakaian lain.
+SPARKLINE_LAYOUT = {
+    'height': 80,
+    'margin': {'l': 0, 'r': 0, 't': 0, 'b': 0},
+    'xaxis': {'visible': False},
+    'yaxis': {'visible': False},
+    'showlegend': False,
+    'plot_bgcolor': 'rgba(0,0,0,0)',
+    'paper_bgcolor': 'rgba(0,0,0,0)',
+}
+
+def _sex_matrix(df, column):
+    """Sorted unique values of column, [value, kelamin] jumlah totals and which kelamin occur"""
+    names, codes = np.unique(np.asarray(df[column]), return_inverse=True)
+    kelamin = np.asarray(df['kelamin'])
+    sex = np.full(len(kelamin), -1)
+    for i, code in enumerate(SEXES):
+        sex[kelamin == code] = i
+    valid = sex >= 0
+    totals = np.zeros((len(names), len(SEXES)), dtype=np.int64)
+    np.add.at(totals, (codes[valid], sex[valid]), df['jumlah'].to_numpy()[valid])
+    return names, totals, np.bincount(sex[valid], minlength=len(SEXES)) > 0
+
+@instrumented()
+def population_pyramid_spec(group_totals, labels):
+    """Population pyramid from [kelamin, kelompok umur] totals"""
+    male, female = group_totals
+    
+    tickvals, ticktext = symmetric_ticks(max(male.max(), female.max()))
+    
+    return {
+        'data': [
+            {
+                'type': 'bar',
+                'y': labels,
+                'x': -male,  # Male negatif supaya di sisi kiri
+                'name': 'Male',
+                'orientation': 'h',
+                'marker': {'color': '#3498db'},
+                'text': format_counts(male),
+                'textposition': 'inside',
+                'hovertemplate': '<b>%{y}</b><br>Male: %{customdata:,.0f}<extra></extra>',
+                'customdata': male,
+            },
+            {
+                'type': 'bar',
+                'y': labels,
+                'x': female,
+                'name': 'Female',
+                'orientation': 'h',
+                'marker': {'color': '#e91e63'},
+                'text': format_counts(female),
+                'textposition': 'inside',
+                'hovertemplate': '<b>%{y}</b><br>Female: %{x:,.0f}<extra></extra>',
+            },
+        ],
+        'layout': {
+            'title': {'text': 'Population Pyramid by Age Group and Gender'},
+            'barmode': 'relative',
+            'height': 600,
+            'xaxis': {
+                'title': {'text': 'Population'},
+                'tickformat': ',d',
+                'tickvals': tickvals,
+                'ticktext': ticktext,
+            },
+            'yaxis': {
+                'title': {'text': 'Age Group'},
+                # Normal order: 0-4 di bawah, 75+ di atas
+                'categoryorder': 'array',
+                'categoryarray': labels,  # Tidak di-reverse
+            },
+            'hovermode': 'y unified',
+            'showlegend': True,
+            'bargap': 0.1,
+        },
+    }
+
+@instrumented()
+def kecamatan_bar_spec(df_filtered):
+    """Stacked bar chart by kecamatan"""
+    names, totals, has_sex = _sex_matrix(df_filtered, 'kecamatan')
+    order = np.argsort(totals.sum(axis=1), kind='stable')
+    
+    data = []
+    for i, (name, color) in enumerate((('Laki-laki', '#3498db'), ('Perempuan', '#e74c3c'))):
+        if has_sex[i]:
+            data.append({
+                'type': 'bar',
+                'y': names[order],
+                'x': totals[order, i],
+                'name': name,
+                'orientation': 'h',
+                'marker': {'color': color},
+                'hovertemplate': f'<b>%{{y}}</b><br>{name}: %{{x:,.0f}}<extra></extra>',
+            })
+    
+    return {
+        'data': data,
+        'layout': {
+            'title': {'text': 'Jumlah Penduduk Per Kecamatan'},
+            'barmode': 'stack',
+            'height': 500,
+            'xaxis': {'title': {'text': 'Jumlah Penduduk'}},
+            'yaxis': {'title': {'text': 'Kecamatan'}},
+            'hovermode': 'y unified',
+        },
+    }
+
+@instrumented()
+def kelurahan_bar_spec(ranking, top_n=15):
+    """Stacked bar chart of the top N kelurahan from a KelurahanRanking"""
+    # Terbesar di atas: plotly menggambar kategori pertama di bawah
+    idx = ranking.top(top_n)[::-1]
+    names = [ranking.kelurahan[i] for i in idx]
+    male, female = ranking.sex_totals[idx].T
+    
+    return {
+        'data': [
+            {'type': 'bar', 'y': names, 'x': male, 'name': 'Laki-laki', 'orientation': 'h',
+             'marker': {'color': '#3498db'}},
+            {'type': 'bar', 'y': names, 'x': female, 'name': 'Perempuan', 'orientation': 'h',
+             'marker': {'color': '#e74c3c'}},
+        ],
+        'layout': {
+            'title': {'text': f'Top {top_n} Kelurahan dengan Populasi Terbesar'},
+            'barmode': 'stack',
+            'height': 600,
+            'xaxis': {'title': {'text': 'Jumlah Penduduk'}},
+            'yaxis': {'title': {'text': 'Kelurahan'}},
+        },
+    }
+
+@instrumented()
+def gender_pie_spec(df_filtered):
+    """Donut chart for gender distribution"""
+    gender_data = df_filtered.groupby('kelamin', observed=True)['jumlah'].sum()
+    
+    return {
+        'data': [{
+            'type': 'pie',
+            'labels': ['Laki-laki' if k == 'L' else 'Perempuan' for k in gender_data.index],
+            'values': gender_data.values,
+            'hole': 0.4,
+            'marker': {'colors': ['#3498db' if k == 'L' else '#e74c3c' for k in gender_data.index]},
+            'textinfo': 'label+percent',
+            'hovertemplate': '<b>%{label}</b><br>Jumlah: %{value:,.0f}<extra></extra>',
+        }],
+        'layout': {
+            'title': {'text': 'Perbandingan Jenis Kelamin'},
+            'height': 400,
+        },
+    }
+
+@instrumented()
+def total_sparkline_spec(summary):
+    """Mini sparkline untuk trend total (3 tahun terakhir)"""
+    return {
+        'data': [{
+            'type': 'scatter',
+            'x': list(summary.trend_years),
+            'y': list(summary.trend_totals),
+            'mode': 'lines',
+            'line': {'color': '#3498db', 'width': 2},
+            'fill': 'tozeroy',
+            'fillcolor': 'rgba(52, 152, 219, 0.2)',
+        }],
+        'layout': SPARKLINE_LAYOUT,
+    }
+
+@instrumented()
+def growth_sparkline_spec(summary):
+    """Mini bar chart untuk growth (semua tahun yang tersedia)"""
+    growth_values = [g or 0 for g in summary.growth_series]
+    return {
+        'data': [{
+            'type': 'bar',
+            'x': list(summary.growth_years),
+            'y': growth_values,
+            'marker': {'color': ['#e74c3c' if x < 0 else '#2ecc71' for x in growth_values]},
+        }],
+        'layout': SPARKLINE_LAYOUT,
+    }
+
+@instrumented()
+def produktif_donut_spec(summary):
+    """Mini donut chart usia produktif vs non-produktif"""
+    return {
+        'data': [{
+            'type': 'pie',
+            'values': [summary.usia_produktif, summary.total - summary.usia_produktif],
+            'hole': 0.6,
+            'marker': {'colors': ['#3498db', '#ecf0f1']},
+            'textinfo': 'none',
+            'hoverinfo': 'skip',
+        }],
+        'layout': {k: v for k, v in SPARKLINE_LAYOUT.items() if k not in ('xaxis', 'yaxis')},
+    }
+
+@instrumented()
+def dependency_gauge_spec(summary):
+    """Mini gauge chart rasio dependensi"""
+    rasio = summary.rasio_dependensi
+    return {
+        'data': [{
+            'type': 'indicator',
+            'mode': 'gauge',  # Hilangkan "+number" agar angka tidak muncul
+            'value': rasio,
+            'domain': {'x': [0, 1], 'y': [0, 1]},
+            'gauge': {
+                'axis': {'range': [None, 100], 'visible': False},
+                'bar': {'color': "#e74c3c" if rasio > 50 else "#f39c12" if rasio > 40 else "#2ecc71"},
+                'bgcolor': "rgba(0,0,0,0)",
+                'borderwidth': 0,
+            },
+        }],
+        'layout': {
+            'height': 60,
+            'margin': SPARKLINE_LAYOUT['margin'],
+            'plot_bgcolor': 'rgba(0,0,0,0)',
+            'paper_bgcolor': 'rgba(0,0,0,0)',
+        },
+    }
+
+@instrumented()
+def top_kecamatan_sparkline_spec(summary):
+    """Mini bar chart top 3 kecamatan"""
+    return {
+        'data': [{
+            'type': 'bar',
+            'x': [pop for _, pop in summary.top3_kecamatan],
+            'y': [kec[:10] for kec, _ in summary.top3_kecamatan],
+            'orientation': 'h',
+            'marker': {'color': '#3498db'},
+        }],
+        'layout': SPARKLINE_LAYOUT,
+    }
+
+@instrumented()
+def year_trend_spec(df):
+    """Population trend across years - TANPA LINE TOTAL"""
+    years, totals, has_sex = _sex_matrix(df, 'tahun')
     
-    return fig
+    data = []
+    for i, (name, color, textposition) in enumerate((('Laki-laki', '#3498db', 'top center'),
+                                                     ('Perempuan', '#e91e63', 'bottom center'))):
+        if has_sex[i]:
+            data.append({
+                'type': 'scatter',
+                'x': years,
+                'y': totals[:, i],
+                'mode': 'lines+markers+text',
+                'name': name,
+                'line': {'color': color, 'width': 3},
+                'marker': {'size': 10},
+                'text': [f'{x:,.0f}' for x in totals[:, i].tolist()],
+                'textposition': textposition,
+                'hovertemplate': f'<b>%{{x}}</b><br>{name}: %{{y:,.0f}}<extra></extra>',
+            })
+    
+    # HAPUS TOTAL LINE (sesuai request user)
+    
+    return {
+        'data': data,
+        'layout': {
+            'title': {'text': 'Trend Pertumbuhan Penduduk Per Tahun'},
+            'height': 500,
+            'xaxis': {'title': {'text': 'Tahun'}, 'type': 'category'},
+            'yaxis': {'title': {'text': 'Jumlah Penduduk'}, 'tickformat': ',d'},
+            'hovermode': 'x unified',
+            'showlegend': True,
+            'legend': {'orientation': 'h', 'yanchor': 'bottom', 'y': 1.02, 'xanchor': 'right', 'x': 1},
+        },
+    }
+
+@instrumented()
+def kecamatan_growth_spec(growth, first_year, last_year):
+    """Bar chart of population growth (%) per kecamatan between two years"""
+    growth = growth.dropna(subset=['Pertumbuhan (%)']).sort_values('Pertumbuhan (%)')
+    pct = growth['Pertumbuhan (%)']
+    
+    return {
+        'data': [{
+            'type': 'bar',
+            'y': growth['Kecamatan'],
+            'x': pct,
+            'orientation': 'h',
+            'marker': {'color': np.where(pct >= 0, '#2ecc71', '#e74c3c')},
+            'text': [f'{v:+.2f}%' for v in pct],
+            'textposition': 'outside',
+            'customdata': growth['Pertumbuhan'],
+            'hovertemplate': '<b>%{y}</b><br>Pertumbuhan: %{x:+.2f}% (%{customdata:+,d} jiwa)<extra></extra>',
+        }],
+        'layout': {
+            'title': {'text': f'Pertumbuhan Penduduk Per Kecamatan ({first_year} - {last_year})'},
+            'height': max(400, 35 * len(growth)),
+            'xaxis': {'title': {'text': 'Pertumbuhan (%)'}, 'ticksuffix': '%'},
+            'yaxis': {'title': {'text': 'Kecamatan'}},
+            'showlegend': False,
+        },
+    }
+
+# ===== FIGURE BUILDERS (VALIDATED) =====
+def create_population_pyramid(group_totals, labels):
+    """Create population pyramid chart with age groups"""
+    return go.Figure(population_pyramid_spec(group_totals, labels))
 
 def create_kecamatan_bar_chart(df_filtered):
     """Create bar chart by kecamatan"""
-    kec_data = df_filtered.groupby(['kecamatan', 'kelamin'])['jumlah'].sum().reset_index()
-    kec_pivot = kec_data.pivot(index='kecamatan', columns='kelamin', values='jumlah').fillna(0)
-    kec_pivot['total'] = kec_pivot.sum(axis=1)
-    kec_pivot = kec_pivot.sort_values('total', ascending=True)
-    
-    fig = go.Figure()
-    
-    if 'L' in kec_pivot.columns:
-        fig.add_trace(go.Bar(
-            y=kec_pivot.index,
-            x=kec_pivot['L'],
-            name='Laki-laki',
-            orientation='h',
-            marker=dict(color='#3498db'),
-            hovertemplate='<b>%{y}</b><br>Laki-laki: %{x:,.0f}<extra></extra>'
-        ))
-    
-    if 'P' in kec_pivot.columns:
-        fig.add_trace(go.Bar(
-            y=kec_pivot.index,
-            x=kec_pivot['P'],
-            name='Perempuan',
-            orientation='h',
-            marker=dict(color='#e74c3c'),
-            hovertemplate='<b>%{y}</b><br>Perempuan: %{x:,.0f}<extra></extra>'
-        ))
-    
-    fig.update_layout(
-        title='Jumlah Penduduk Per Kecamatan',
-        barmode='stack',
-        height=500,
-        xaxis=dict(title='Jumlah Penduduk'),
-        yaxis=dict(title='Kecamatan'),
-        hovermode='y unified'
+    return go.Figure(kecamatan_bar_spec(df_filtered))
+
+def create_kelurahan_bar_chart(ranking, top_n=15):
+    """Create bar chart by kelurahan (top N) from a KelurahanRanking"""
+    return go.Figure(kelurahan_bar_spec(ranking, top_n))
+
+def create_gender_pie_chart(df_filtered):
+    """Create pie chart for gender distribution"""
+    return go.Figure(gender_pie_spec(df_filtered))
+
+def create_total_sparkline(summary):
+    return go.Figure(total_sparkline_spec(summary))
+
+def create_growth_sparkline(summary):
+    return go.Figure(growth_sparkline_spec(summary))
+
+def create_produktif_donut(summary):
+    return go.Figure(produktif_donut_spec(summary))
+
+def create_dependency_gauge(summary):
+    return go.Figure(dependency_gauge_spec(summary))
+
+def create_top_kecamatan_sparkline(summary):
+    return go.Figure(top_kecamatan_sparkline_spec(summary))
+
+def create_year_trend_chart(df):
+    """Create population trend chart across years - TANPA LINE TOTAL"""
+    return go.Figure(year_trend_spec(df))
+
+# ===== SHARED FIGURE CACHE =====
+# Cache figure lintas session dalam satu proses: viewer embed yang membuka view
+# default yang sama berbagi satu render. Key = (jenis chart, filter, versi data).
+# Yang disimpan adalah JSON final yang dikirim ke browser, jadi cache hit tidak
+# membangun go.Figure atau menserialisasi ulang.
+FIGURE_CACHE_MAX_BYTES = int(float(os.environ.get('DASHBOARD_FIGURE_CACHE_MB', '64')) * 1024 * 1024)
+PLOTLY_DEFAULT_HEIGHT = 450  # tinggi default plotly.js (sama dengan st.plotly_chart)
+
+def _json_default(obj):
+    """numpy arrays/scalars, pandas Series/Index -> plain lists and numbers"""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def figure_json(spec):
+    """Serialize a figure spec dict to JSON bytes (orjson if installed)"""
+    if orjson is not None:
+        return orjson.dumps(spec, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(spec, default=_json_default, separators=(',', ':')).encode('utf-8')
+
+def load_figure_json(payload):
+    return orjson.loads(payload) if orjson is not None else json.loads(payload)
+
+class RenderedFigure(NamedTuple):
+    """A figure serialized the way st.plotly_chart sends it: JSON spec + pixel height"""
+    spec: str
+    height: int
+
+@functools.lru_cache(maxsize=None)
+def default_template():
+    """Layout template go.Figure would attach (tema plotly streamlit)"""
+    return pio.templates[pio.templates.default].to_plotly_json()
+
+def render_figure(spec):
+    """Serialize a figure spec once, with the template go.Figure would add, into a RenderedFigure"""
+    layout = {'template': default_template(), **spec.get('layout', {})}
+    return RenderedFigure(
+        figure_json({**spec, 'layout': layout}).decode('utf-8'),
+        layout.get('height') or PLOTLY_DEFAULT_HEIGHT,
     )
+
+class FigureCache:
+    """Thread-safe LRU cache of serialized figures, bounded by total bytes"""
     
-    return fig
-
-def create_kelurahan_bar_chart(df_filtered, top_n=15):
-    """Create bar chart by kelurahan (top N)"""
-    kel_data = df_filtered.groupby(['kelurahan', 'kelamin'])['jumlah'].sum().reset_index()
-    kel_pivot = kel_data.pivot(index='kelurahan', columns='kelamin', values='jumlah').fillna(0)
-    kel_pivot['total'] = kel_pivot.sum(axis=1)
-    kel_pivot = kel_pivot.sort_values('total', ascending=False).head(top_n)
-    kel_pivot = kel_pivot.sort_values('total', ascending=True)
-    
-    fig = go.Figure()
-    
-    if 'L' in kel_pivot.columns:
-        fig.add_trace(go.Bar(
-            y=kel_pivot.index,
-            x=kel_pivot['L'],
-            name='Laki-laki',
-            orientation='h',
-            marker=dict(color='#3498db')
-        ))
-    
-    if 'P' in kel_pivot.columns:
-        fig.add_trace(go.Bar(
-            y=kel_pivot.index,
-            x=kel_pivot['P'],
-            name='Perempuan',
-            orientation='h',
-            marker=dict(color='#e74c3c')
-        ))
-    
-    fig.update_layout(
-        title=f'Top {top_n} Kelurahan dengan Populasi Terbesar',
-        barmode='stack',
-        height=600,
-        xaxis=dict(title='Jumlah Penduduk'),
-        yaxis=dict(title='Kelurahan')
-    )
+    def __init__(self, max_bytes, sizeof=len):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+    
+    def get_or_build(self, key, build):
+        """Return the cached value for key, calling build() on a miss"""
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return payload
+            self.misses += 1
+        
+        # Build di luar lock supaya session lain tidak menunggu
+        payload = build()
+        size = self.sizeof(payload)
+        if size > self.max_bytes:
+            return payload
+        
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = payload
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= self.sizeof(evicted)
+                    self.evictions += 1
+        return payload
     
-    return fig
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
 
-def create_gender_pie_chart(df_filtered):
-    """Create pie chart for gender distribution"""
-    gender_data = df_filtered.groupby('kelamin')['jumlah'].sum()
-    
-    labels = ['Laki-laki' if k == 'L' else 'Perempuan' for k in gender_data.index]
-    values = gender_data.values
-    colors = ['#3498db' if k == 'L' else '#e74c3c' for k in gender_data.index]
-    
-    fig = go.Figure(data=[go.Pie(
-        labels=labels,
-        values=values,
-        hole=0.4,
-        marker=dict(colors=colors),
-        textinfo='label+percent',
-        hovertemplate='<b>%{label}</b><br>Jumlah: %{value:,.0f}<extra></extra>'
-    )])
-    
-    fig.update_layout(
-        title='Perbandingan Jenis Kelamin',
-        height=400  
+@st.cache_resource
+def figure_cache():
+    """The process-wide figure cache (one instance shared by all sessions)"""
+    return FigureCache(FIGURE_CACHE_MAX_BYTES, sizeof=lambda figure: len(figure.spec))
+
+def cached_figure(chart, key, build):
+    """Serve a RenderedFigure from the shared cache, building its spec with build(cube) on a miss"""
+    cube = load_cube()
+    with perf_step(f'figure[{chart}]') as info:
+        figure = figure_cache().get_or_build(
+            (chart, key, cube.version),
+            lambda: render_figure(build(cube))
+        )
+        info['bytes'] = len(figure.spec)
+    return figure
+
+def _enqueue_figure_json(figure, config):
+    """Send a RenderedFigure as a PlotlyChart element without re-serializing (streamlit internals)"""
+    dg = st._main
+    proto = PlotlyChartProto()
+    proto.theme = "streamlit"
+    proto.form_id = current_form_id(dg)
+    proto.spec = figure.spec
+    proto.config = json.dumps(config or {})
+    proto.id = compute_and_register_element_id(
+        "plotly_chart",
+        user_key=None,
+        key_as_main_identity=False,
+        dg=dg,
+        plotly_spec=proto.spec,
+        plotly_config=proto.config,
+        theme=proto.theme,
+        width="stretch",
+        height=figure.height,
+    )
+    dg._enqueue("plotly_chart", proto, layout_config=LayoutConfig(width="stretch", height=figure.height))
+
+@st.cache_resource
+def figure_transport():
+    """Process-wide switch: cached JSON goes out directly until the internals fail once"""
+    return {'direct': PlotlyChartProto is not None}
+
+def show_figure(figure, config=None):
+    """st.plotly_chart(width="stretch") for a RenderedFigure, sending the cached JSON as-is
+
+    st.plotly_chart membangun go.Figure lalu memanggil to_dict()/to_json() di setiap
+    pemanggilan; di sini proto PlotlyChart diisi langsung dari string JSON cache.
+    """
+    transport = figure_transport()
+    if transport['direct']:
+        try:
+            _enqueue_figure_json(figure, config)
+            return
+        except (AttributeError, TypeError, StreamlitAPIException) as e:
+            # API internal berubah di versi streamlit ini: pakai st.plotly_chart seterusnya
+            logger.warning("Gagal mengirim JSON figure langsung (%s), kembali ke st.plotly_chart", e)
+            transport['direct'] = False
+    st.plotly_chart(go.Figure(load_figure_json(figure.spec), _validate=False), width="stretch", config=config)
+
+# ===== FIGURES PER FILTER =====
+TABLE_CACHE_ENTRIES = 128
+
+class FilterKey(NamedTuple):
+    """Hashable filter state of the single-year view"""
+    year: str
+    kecamatan: tuple = ()  # kecamatan terpilih, terurut (kosong = semua)
+    kelurahan: tuple = ()  # kelurahan terpilih, terurut (kosong = semua)
+    age_range: tuple = (0, MAX_AGE)
+
+def select_key(cube, key):
+    """Cube selection for a FilterKey"""
+    return select_cube(cube, key.year, key.kecamatan, key.kelurahan, key.age_range)
+
+def summary_for(cube, key):
+    return compute_summary(select_key(cube, key), cube)
+
+def summary_sparklines(key, has_previous):
+    """The five Ringkasan Data mini charts (growth is None without a previous year)"""
+    return (
+        cached_figure('spark_total', key, lambda cube: total_sparkline_spec(summary_for(cube, key))),
+        cached_figure('spark_growth', key, lambda cube: growth_sparkline_spec(summary_for(cube, key)))
+        if has_previous else None,
+        cached_figure('spark_produktif', key, lambda cube: produktif_donut_spec(summary_for(cube, key))),
+        cached_figure('spark_dependensi', key, lambda cube: dependency_gauge_spec(summary_for(cube, key))),
+        cached_figure('spark_kecamatan', key, lambda cube: top_kecamatan_sparkline_spec(summary_for(cube, key))),
     )
+
+def year_trend_figure():
+    return cached_figure('trend', (), lambda cube: year_trend_spec(year_sex_frame(cube)))
+
+def pyramid_inputs(cube, key, grouping=AGE_GROUPING_DEFAULT):
+    """(group totals, labels) of the population pyramid for one age grouping"""
+    bounds = AGE_GROUPINGS[grouping]
+    return select_key(cube, key).age_band_totals(bounds), [age_label(lo, hi) for lo, hi in bounds]
+
+def population_pyramid_figure(key, grouping=AGE_GROUPING_DEFAULT):
+    return cached_figure('pyramid', (key, grouping),
+                         lambda cube: population_pyramid_spec(*pyramid_inputs(cube, key, grouping)))
+
+def kecamatan_bar_figure(key):
+    return cached_figure('kecamatan', key, lambda cube: kecamatan_bar_spec(select_key(cube, key).kecamatan_sex_frame()))
+
+def gender_pie_figure(key):
+    return cached_figure('gender', key, lambda cube: gender_pie_spec(select_key(cube, key).sex_frame()))
+
+@functools.lru_cache(maxsize=TABLE_CACHE_ENTRIES)
+def kelurahan_ranking(cube, key):
+    """KelurahanRanking per filter, shared by the Top N slider and the detail tables"""
+    return select_key(cube, key).kelurahan_ranking()
+
+def kelurahan_bar_figure(key, top_n):
+    return cached_figure(
+        'kelurahan', (key, top_n),
+        lambda cube: kelurahan_bar_spec(kelurahan_ranking(cube, key), top_n)
+    )
+
+# Tabel Data Detail: hanya view yang dibuka yang dihitung (cache per FilterKey + view)
+DETAIL_VIEWS = ("Per Kecamatan", "Per Kelurahan", "Data Mentah")
+
+@st.cache_data(max_entries=TABLE_CACHE_ENTRIES, show_spinner=False)
+@instrumented()
+def detail_table(key, view):
+    """Per Kecamatan or Per Kelurahan summary table of a FilterKey"""
+    cube = load_cube()
+    if view == "Per Kecamatan":
+        return pd.DataFrame(list(summary_for(cube, key).kecamatan_ranking), columns=['Kecamatan', 'Total Penduduk'])
+    ranking = kelurahan_ranking(cube, key)
+    order = ranking.order
+    return pd.DataFrame({
+        'Kecamatan': [ranking.kecamatan[i] for i in order],
+        'Kelurahan': [ranking.kelurahan[i] for i in order],
+        'Total Penduduk': ranking.totals[order],
+    })
+
+def age_band_rows(custom=None):
+    """AGE_BANDS (plus the slider's custom band) as hashable (nama, lo, hi) tuples"""
+    bands = tuple((name, lo, hi) for name, (lo, hi) in AGE_BANDS.items())
+    return bands + (('Kustom', *custom),) if custom is not None else bands
+
+@instrumented()
+def age_band_table(cube, key, bands):
+    """Kelompok Umur table: per-sex totals of each (nama, lo, hi) band within the filter"""
+    selection = select_key(cube, key)
+    totals = selection.age_band_totals([(lo, hi) for _, lo, hi in bands])
+    total = selection.total()
+    band_totals = totals.sum(axis=0)
+    return pd.DataFrame({
+        'Kelompok': [name for name, _, _ in bands],
+        'Umur': [age_label(lo, hi) for _, lo, hi in bands],
+        'Laki-laki': totals[0],
+        'Perempuan': totals[1],
+        'Total': band_totals,
+        '% dari Total': band_totals / total * 100 if total else np.zeros(len(bands)),
+    })
+
+# Data Mentah: hanya halaman yang terlihat yang dikirim ke browser
+RAW_PAGE_SIZES = (25, 50, 100, 500)
+RAW_SORT_COLUMNS = {
+    'Urutan data': None,
+    'Kecamatan': 'kecamatan',
+    'Kelurahan': 'kelurahan',
+    'Kelamin': 'kelamin',
+    'Umur': 'umur',
+    'Jumlah': 'jumlah',
+}
+
+@st.cache_resource(max_entries=TABLE_CACHE_ENTRIES, show_spinner=False)
+@instrumented()
+def raw_row_index(key, sort_column=None, descending=False, search=''):
+    """Row positions in load_data() for the Data Mentah table: filtered, searched and sorted
+
+    cache_resource: array yang sama (read-only) dipakai ulang tiap rerun/ganti halaman,
+    tanpa pickle + copy ratusan ribu posisi per cache hit seperti cache_data.
+    """
+    df = load_data()
+    rows = np.flatnonzero(filter_mask(df, key.year, key.kecamatan, key.kelurahan, key.age_range))
+    
+    if search:
+        kelurahan = df['kelurahan']
+        matches = np.flatnonzero(kelurahan.cat.categories.str.contains(search, case=False, regex=False))
+        rows = rows[np.isin(kelurahan.cat.codes.to_numpy()[rows], matches)]
     
-    return fig
+    if sort_column is not None:
+        column = df[sort_column]
+        # Kategori sudah ordered & terurut abjad, jadi cukup urutkan kodenya
+        values = column.cat.codes.to_numpy() if isinstance(column.dtype, pd.CategoricalDtype) else column.to_numpy()
+        values = values[rows].astype(np.int64)
+        rows = rows[np.argsort(-values if descending else values, kind='stable')]
+    rows.flags.writeable = False
+    return rows
 
-def create_year_trend_chart(df):
-    """Create population trend chart across years - TANPA LINE TOTAL"""
-    yearly_data = df.groupby(['tahun', 'kelamin'])['jumlah'].sum().reset_index()
-    
-    yearly_pivot = yearly_data.pivot(index='tahun', columns='kelamin', values='jumlah').reset_index()
-    yearly_pivot = yearly_pivot.sort_values('tahun')
-    
-    fig = go.Figure()
-    
-    if 'L' in yearly_pivot.columns:
-        fig.add_trace(go.Scatter(
-            x=yearly_pivot['tahun'],
-            y=yearly_pivot['L'],
-            mode='lines+markers+text',
-            name='Laki-laki',
-            line=dict(color='#3498db', width=3),
-            marker=dict(size=10),
-            text=yearly_pivot['L'].apply(lambda x: f'{x:,.0f}'),
-            textposition='top center',
-            hovertemplate='<b>%{x}</b><br>Laki-laki: %{y:,.0f}<extra></extra>'
-        ))
-    
-    if 'P' in yearly_pivot.columns:
-        fig.add_trace(go.Scatter(
-            x=yearly_pivot['tahun'],
-            y=yearly_pivot['P'],
-            mode='lines+markers+text',
-            name='Perempuan',
-            line=dict(color='#e91e63', width=3),
-            marker=dict(size=10),
-            text=yearly_pivot['P'].apply(lambda x: f'{x:,.0f}'),
-            textposition='bottom center',
-            hovertemplate='<b>%{x}</b><br>Perempuan: %{y:,.0f}<extra></extra>'
-        ))
+# ===== EXPORT =====
+# Export dibuat saat tombol diklik (callable di st.download_button), ditulis per chunk
+# langsung ke buffer biner, dan di-cache per filter key + format.
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'CSV (gzip)': ('csv.gz', 'application/gzip'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+EXPORT_CHUNK_ROWS = 50_000
+EXPORT_CACHE_ENTRIES = 16
+
+def write_export(df, fmt, sink):
+    """Write df to a binary sink as CSV, gzip CSV or Parquet, in chunks of EXPORT_CHUNK_ROWS"""
+    if fmt == 'Parquet':
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(table, sink, row_group_size=EXPORT_CHUNK_ROWS)
+        return
     
-    # HAPUS TOTAL LINE (sesuai request user)
+    stream = gzip.GzipFile(fileobj=sink, mode='wb', mtime=0) if fmt == 'CSV (gzip)' else sink
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    df.to_csv(text, index=False, chunksize=EXPORT_CHUNK_ROWS)
+    text.flush()
+    text.detach()
+    if stream is not sink:
+        stream.close()
+
+@instrumented()
+def encode_export(df, fmt):
+    buffer = io.BytesIO()
+    write_export(df, fmt, buffer)
+    return buffer.getvalue()
+
+@st.cache_data(max_entries=EXPORT_CACHE_ENTRIES, show_spinner=False)
+def filtered_export(key, fmt):
+    """Export bytes of the Data Mentah rows for a FilterKey"""
+    df = load_data()
+    return encode_export(filter_frame(df, key.year, key.kecamatan, key.kelurahan, key.age_range), fmt)
+
+@st.cache_data(max_entries=EXPORT_CACHE_ENTRIES, show_spinner=False)
+def comparison_export(years, fmt):
+    """Export bytes of every row in the selected years"""
+    df = load_data()
+    return encode_export(df[df['tahun'].isin(years)], fmt)
+
+def export_download_button(label, file_stem, build, key):
+    """Format picker + download button whose data is only built when clicked"""
+    fmt = st.radio("Format:", list(EXPORT_FORMATS), horizontal=True, key=f'{key}_format')
+    extension, mime = EXPORT_FORMATS[fmt]
+    st.download_button(
+        label,
+        lambda: build(fmt),
+        f'{file_stem}.{extension}',
+        mime,
+        key=key
+    )
+
+# ===== PERBANDINGAN MULTI TAHUN =====
+# Semua tabel & chart mode perbandingan dirakit dari YearSummary, jadi biayanya
+# tergantung jumlah tahun/wilayah, bukan jumlah baris data.
+def comparison_year_table(summary, years):
+    """Tabel Perbandingan Detail: totals, wilayah counts and growth per year"""
+    idx = summary.year_index(years)
+    totals = summary.year_sex[idx]
+    table = pd.DataFrame({
+        'Tahun': list(years),
+        'Total Penduduk': totals.sum(axis=1),
+        'Jumlah Kecamatan': summary.kecamatan_present[idx].sum(axis=1),
+        'Jumlah Kelurahan': summary.kelurahan_present[idx].sum(axis=1),
+        'Laki-laki': totals[:, 0],
+        'Perempuan': totals[:, 1],
+    })
+    table['Pertumbuhan (%)'] = table['Total Penduduk'].pct_change() * 100
+    return table
+
+def wilayah_growth_table(columns, totals, present):
+    """Wide table of per-year totals plus growth from the first to the last year
+
+    columns: {nama kolom: nilai per wilayah}; totals/present: [tahun, wilayah]
+    """
+    keep = present.any(axis=0)
+    table = pd.DataFrame({name: np.asarray(values, dtype=object)[keep] for name, values in columns.items()})
+    first, last = totals[0, keep], totals[-1, keep]
+    table['Pertumbuhan'] = last - first
+    with np.errstate(divide='ignore', invalid='ignore'):
+        table['Pertumbuhan (%)'] = np.where(first > 0, (last - first) / first * 100, np.nan)
+    return table
+
+COMPARISON_VIEWS = ("Per Tahun", "Per Kecamatan", "Per Kelurahan")
+
+@st.cache_data(max_entries=TABLE_CACHE_ENTRIES, show_spinner=False)
+@instrumented()
+def comparison_tables(years):
+    """Per-year and per-kecamatan comparison tables for sorted years (ringkasan + chart pertumbuhan)"""
+    summary = load_year_summary()
+    idx = summary.year_index(years)
     
-    fig.update_layout(
-        title='Trend Pertumbuhan Penduduk Per Tahun',
-        height=500,
-        xaxis=dict(title='Tahun', type='category'),
-        yaxis=dict(title='Jumlah Penduduk', tickformat=',d'),
-        hovermode='x unified',
-        showlegend=True,
-        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    kec_totals = summary.kecamatan_sex[idx].sum(axis=2)
+    kec_growth = wilayah_growth_table(
+        {'Kecamatan': summary.kecamatan, **{y: kec_totals[j] for j, y in enumerate(years)}},
+        kec_totals, summary.kecamatan_present[idx],
+    )
+    return (
+        comparison_year_table(summary, years),
+        kec_growth.sort_values('Pertumbuhan (%)', ascending=False),
     )
+
+@st.cache_data(max_entries=TABLE_CACHE_ENTRIES, show_spinner=False)
+@instrumented()
+def comparison_kelurahan_table(years):
+    """Per-kelurahan comparison table, built only when its view is opened"""
+    summary = load_year_summary()
+    idx = summary.year_index(years)
+    kel_totals = summary.kelurahan_sex[idx].sum(axis=2)
+    kel_growth = wilayah_growth_table(
+        {'Kecamatan': summary.kelurahan_kecamatan, 'Kelurahan': summary.kelurahan,
+         **{y: kel_totals[j] for j, y in enumerate(years)}},
+        kel_totals, summary.kelurahan_present[idx],
+    )
+    return kel_growth.sort_values('Pertumbuhan (%)', ascending=False)
+
+def comparison_trend_figure(years):
+    return cached_figure('trend_comparison', years,
+                         lambda cube: year_trend_spec(load_year_summary().year_sex_frame(years)))
+
+def kecamatan_growth_figure(years):
+    return cached_figure('kecamatan_growth', years,
+                         lambda cube: kecamatan_growth_spec(comparison_tables(years)[1], years[0], years[-1]))
+
+# ===== PARALLEL FIGURE BUILD =====
+# Full rerun view single tahun: semua figure & tabel dibangun dulu (paralel kalau
+# DASHBOARD_FIGURE_WORKERS > 1) ke cache bersama, lalu section menampilkannya berurutan.
+FIGURE_WORKERS = max(1, int(os.environ.get('DASHBOARD_FIGURE_WORKERS', '1')))
+try:  # Nama atribut thread tempat add_script_run_ctx menyimpan context (internal streamlit)
+    from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
+except ImportError:
+    SCRIPT_RUN_CONTEXT_ATTR_NAME = 'streamlit_script_run_ctx'
+
+@st.cache_resource
+def figure_pool(workers):
+    """Process-wide thread pool for figure builds"""
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='figure')
+
+def _timed_build(ctx, build):
+    """Run build() in a pool thread under the session's script context; returns ms
+
+    Thread pool dipakai ulang lintas session, jadi context sebelumnya dipulihkan setelah
+    build: thread tidak membawa session lama ke sampel perf atau warning cache berikutnya.
+    """
+    thread = threading.current_thread()
+    previous = getattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+    add_script_run_ctx(thread, ctx)
+    try:
+        start = time.perf_counter()
+        build()
+        return (time.perf_counter() - start) * 1000
+    finally:
+        if previous is None:
+            thread.__dict__.pop(SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+        else:
+            setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, previous)
+
+@instrumented()
+def prebuild_single_year(cube, key, top_n, grouping=AGE_GROUPING_DEFAULT, detail_view=None,
+                         workers=FIGURE_WORKERS):
+    """Warm the figure and table caches of the visible sections of one filter; returns build timings in ms
+
+    top_n None = grafik kelurahan tertutup; detail_view None = belum ada tabel detail yang dibuka
+    """
+    tasks = {
+        'sparklines': lambda: summary_sparklines(key, summary_for(cube, key).has_previous),
+        'trend': year_trend_figure,
+        'pyramid': lambda: population_pyramid_figure(key, grouping),
+        'kecamatan': lambda: kecamatan_bar_figure(key),
+        'gender': lambda: gender_pie_figure(key),
+    }
+    if top_n is not None:
+        tasks['kelurahan'] = lambda: kelurahan_bar_figure(key, top_n)
+    if detail_view in ("Per Kecamatan", "Per Kelurahan"):
+        tasks['tables'] = lambda: detail_table(key, detail_view)
+    start = time.perf_counter()
+    if workers > 1:
+        ctx = get_script_run_ctx()
+        pool = figure_pool(workers)
+        futures = {name: pool.submit(_timed_build, ctx, build) for name, build in tasks.items()}
+        steps = {name: future.result() for name, future in futures.items()}
+    else:
+        steps = {name: _timed_build(get_script_run_ctx(), build) for name, build in tasks.items()}
+    wall = (time.perf_counter() - start) * 1000
+    
+    timings = {'workers': workers, 'wall_ms': round(wall, 2),
+               'sum_ms': round(sum(steps.values()), 2),
+               'steps_ms': {name: round(ms, 2) for name, ms in steps.items()}}
+    logger.debug("Prebuild figure %s: %s", key, timings)
+    return timings
+
+# ===== SECTIONS =====
+# Tiap section hanya bergantung pada FilterKey. Section dengan widget sendiri dibungkus
+# st.fragment, jadi widget di dalamnya hanya me-rerun section itu, bukan seluruh main().
+SPARKLINE_CONFIG = {'displayModeBar': False}
+TOP_N_DEFAULT = 15
+
+@instrumented()
+def render_summary_section(cube, key):
+    """Ringkasan Data: metric cards with their mini charts"""
+    st.header("📊 Ringkasan Data")
+    
+    summary = summary_for(cube, key)
+    fig_spark1, fig_spark2, fig_spark3, fig_spark4, fig_spark5 = summary_sparklines(key, summary.has_previous)
+    
+    # Display metrics dengan mini charts
+    col1, col2, col3, col4, col5 = st.columns(5)
+    
+    with col1:
+        st.metric(
+            "👥 Total Penduduk",
+            format_number(summary.total)
+        )
+        show_figure(fig_spark1, config=SPARKLINE_CONFIG)
+    
+    with col2:
+        if summary.has_previous:
+            st.metric(
+                "📈 Pertumbuhan",
+                f"{summary.growth_pct:+.2f}%",
+                delta=f"{summary.growth:+,} jiwa"
+            )
+            show_figure(fig_spark2, config=SPARKLINE_CONFIG)
+        else:
+            st.metric(
+                "📈 Pertumbuhan",
+                "N/A",
+            )
+            st.caption("Data tahun sebelumnya tidak tersedia")
+    
+    with col3:
+        st.metric(
+            "💼 Usia Produktif",
+            format_number(summary.usia_produktif)
+        )
+        st.caption(f"{summary.pct_produktif:.1f}% dari total")
+        show_figure(fig_spark3, config=SPARKLINE_CONFIG)
+    
+    with col4:
+        st.metric(
+            "👶👴 Rasio Dependensi",
+            f"{summary.rasio_dependensi:.1f}",
+        )
+        st.caption("per 100 produktif")
+        show_figure(fig_spark4, config=SPARKLINE_CONFIG)
+    
+    with col5:
+        kec_largest, kec_largest_pop = summary.kecamatan_terbesar
+        st.metric(
+            "🏘️ Kecamatan Terbesar",
+            kec_largest[:12] + "..." if len(kec_largest) > 12 else kec_largest,
+        )
+        st.caption(f"{format_number(kec_largest_pop)} jiwa")
+        show_figure(fig_spark5, config=SPARKLINE_CONFIG)
+    
+    # Sex ratio info box (tidak di metrics utama, tapi tetap ada)
+    if summary.total > 0 and summary.sex_ratio is not None:
+        st.info(f"**Rasio Jenis Kelamin:** {summary.sex_ratio:.2f} laki-laki per 100 perempuan")
+
+@instrumented()
+def render_trend_section():
+    st.header("📈 Trend Pertumbuhan Penduduk")
+    st.markdown("*Pertumbuhan populasi dari tahun ke tahun*")
+    show_figure(year_trend_figure())
+
+@st.fragment
+@instrumented()
+def render_pyramid_section(key):
+    """Piramida Penduduk and Kelompok Umur; both widgets rerun only this fragment"""
+    st.header("👥 Piramida Penduduk")
+    grouping = st.radio("Kelompok umur:", list(AGE_GROUPINGS), horizontal=True, key='age_grouping')
+    show_figure(population_pyramid_figure(key, grouping))
     
-    return fig
+    st.subheader("🎯 Kelompok Umur")
+    custom = st.slider("Kelompok kustom:", 0, MAX_AGE, CUSTOM_AGE_BAND_DEFAULT, key='custom_age_band')
+    table = age_band_table(load_cube(), key, age_band_rows(tuple(custom)))
+    st.dataframe(table, width="stretch", hide_index=True)
+    if key.age_range != (0, MAX_AGE):
+        min_age, max_age = key.age_range
+        st.caption(f"Dihitung di dalam Range Umur {min_age} - {max_age}{'+' if max_age == MAX_AGE else ''} tahun")
+
+@instrumented()
+def render_kecamatan_gender_section(key):
+    col_left, col_right = st.columns([2, 1])
+    
+    with col_left:
+        st.header("🏘️ Analisis Per Kecamatan")
+        show_figure(kecamatan_bar_figure(key))
+    
+    with col_right:
+        st.header("⚧️ Distribusi Gender")
+        show_figure(gender_pie_figure(key))
+
+def section_view(views, key):
+    """Tab-like picker of an on-demand section: only the chosen view is computed (None = closed)
+
+    st.tabs merender isi semua tab setiap rerun; radio tanpa pilihan awal tidak menghitung apa pun
+    """
+    view = st.radio("Tampilkan:", views, index=None, horizontal=True, key=key)
+    if view is None:
+        st.caption("Pilih tabel untuk ditampilkan; tabel dihitung saat dibuka")
+    return view
+
+@st.fragment
+@instrumented()
+def render_kelurahan_section(key):
+    """Top N kelurahan chart, built only while its toggle is on; the widgets rerun only this fragment"""
+    st.header("🏡 Analisis Per Kelurahan")
+    if not st.toggle("Tampilkan grafik Top N Kelurahan", key='show_kelurahan'):
+        return
+    top_n = st.slider("Tampilkan Top N Kelurahan:", 10, 30, TOP_N_DEFAULT, key='top_n')
+    show_figure(kelurahan_bar_figure(key, top_n))
+
+@st.fragment
+@instrumented()
+def render_detail_tables_section(df, key):
+    """Tabel Data Detail views; switching view or downloading reruns only this fragment"""
+    st.header("📋 Tabel Data Detail")
+    
+    view = section_view(DETAIL_VIEWS, 'detail_view')
+    if view == "Data Mentah":
+        render_raw_data_table(df, key)
+        
+        export_download_button(
+            "📥 Download Data",
+            f'data_kependudukan_{key.year}_filtered',
+            lambda fmt: filtered_export(key, fmt),
+            key='download_filtered'
+        )
+    elif view is not None:
+        st.dataframe(detail_table(key, view), width="stretch", hide_index=True)
+
+@st.fragment
+@instrumented()
+def render_comparison_tables_section(years):
+    """Tabel Perbandingan Detail views; switching view reruns only this fragment"""
+    st.header("📋 Tabel Perbandingan Detail")
+    
+    view = section_view(COMPARISON_VIEWS, 'comparison_view')
+    if view == "Per Kelurahan":
+        st.dataframe(comparison_kelurahan_table(years), width="stretch", hide_index=True)
+    elif view is not None:
+        year_table, kec_growth = comparison_tables(years)
+        st.dataframe(year_table if view == "Per Tahun" else kec_growth, width="stretch", hide_index=True)
+
+def _reset_raw_page():
+    st.session_state['raw_page'] = 1
+
+def render_raw_data_table(df, key):
+    """Paginated Data Mentah viewer; rows are filtered, sorted and sliced server-side"""
+    col_search, col_sort, col_order, col_size = st.columns([3, 2, 2, 1])
+    with col_search:
+        search = st.text_input("🔍 Cari Kelurahan:", key='raw_search', on_change=_reset_raw_page).strip()
+    with col_sort:
+        sort_label = st.selectbox("Urutkan berdasarkan:", list(RAW_SORT_COLUMNS), key='raw_sort',
+                                  on_change=_reset_raw_page)
+    with col_order:
+        descending = st.radio("Urutan:", ['Naik', 'Turun'], horizontal=True, key='raw_order',
+                              on_change=_reset_raw_page,
+                              disabled=RAW_SORT_COLUMNS[sort_label] is None) == 'Turun'
+    with col_size:
+        page_size = st.selectbox("Baris:", RAW_PAGE_SIZES, index=1, key='raw_page_size', on_change=_reset_raw_page)
+    
+    rows = raw_row_index(key, RAW_SORT_COLUMNS[sort_label], descending, search)
+    n_pages = max(1, -(-len(rows) // page_size))
+    # Halaman lama bisa melebihi jumlah halaman setelah filter berubah
+    if st.session_state.get('raw_page', 1) > n_pages:
+        st.session_state['raw_page'] = 1
+    page = st.number_input(f"Halaman (dari {n_pages}):", min_value=1, max_value=n_pages, step=1, key='raw_page')
+    
+    start = (page - 1) * page_size
+    page_rows = rows[start:start + page_size]
+    st.dataframe(df.iloc[page_rows], width="stretch", hide_index=True)
+    if len(rows):
+        st.caption(f"Baris {format_number(start + 1)}–{format_number(start + len(page_rows))} "
+                   f"dari {format_number(len(rows))}")
+    else:
+        st.caption("Tidak ada baris yang cocok")
+
+def keep_valid_choices(key, options):
+    """Drop multiselect choices that are no longer among the options (tahun/kecamatan berubah)"""
+    if key in st.session_state:
+        allowed = set(options)
+        st.session_state[key] = [v for v in st.session_state[key] if v in allowed]
+
+def render_debug_panel():
+    """Hidden sidebar panel (?debug=1 or DASHBOARD_DEBUG=1): cache counters and step timings"""
+    with st.sidebar.expander("🛠️ Debug: Figure Cache"):
+        st.json(figure_cache().stats())
+        if 'figure_timings' in st.session_state:
+            timings = st.session_state['figure_timings']
+            st.caption(f"Build figure: {timings['wall_ms']:.1f} ms wall / {timings['sum_ms']:.1f} ms total "
+                       f"({timings['workers']} worker)")
+            st.json(timings['steps_ms'])
+        st.caption(f"Frame penduduk: {format_number(load_data().memory_usage(deep=True).sum())} bytes")
+        if os.path.exists(SHARED_DATASET_PATH):
+            st.caption(f"Dataset bersama (memory-mapped): `{SHARED_DATASET_PATH}`, "
+                       f"{format_number(os.path.getsize(SHARED_DATASET_PATH))} bytes")
+    
+    with st.sidebar.expander("📥 Debug: Ingestion"):
+        for path, entry in load_manifest()['files'].items():
+            report = entry.get('report')
+            if report is None:
+                st.caption(f"`{path}`: laporan tidak tersedia (partisi dari cache lama)")
+                continue
+            st.caption(f"`{path}`: {format_number(report['rows_accepted'])} dari "
+                       f"{format_number(report['rows_read'])} baris diterima")
+            if report['rejected'] or report['aliased']:
+                st.json({'ditolak': report['rejected'], 'alias': report['aliased']})
+    
+    recorder = perf_recorder()
+    with st.sidebar.expander("⏱️ Debug: Waktu Per Langkah"):
+        st.caption("Rerun terakhir session ini")
+        steps = pd.DataFrame(recorder.last_run(_session_id()), columns=['step', 'wall_ms', 'rows', 'bytes'])
+        steps = steps.astype({'rows': 'Int64', 'bytes': 'Int64'})
+        st.dataframe(steps, hide_index=True)
+        st.caption(f"p50/p95 semua session (maks. {PERF_WINDOW} sampel terakhir per langkah)")
+        stats = pd.DataFrame.from_dict(recorder.percentiles(), orient='index')
+        st.dataframe(stats.sort_values('p95_ms', ascending=False) if len(stats) else stats)
+        if recorder.log_path:
+            st.caption(f"Log JSON-lines: `{recorder.log_path}`")
+
+# ===== STATIC SNAPSHOT =====
+# Bundle JSON statis (KPI + spec figure + tabel) untuk view default dan tiap kecamatan
+# per tahun, dibangun oleh build_snapshots.py dan ditampilkan viewer.html
+# tanpa session Python. Filter di luar set ini diteruskan ke app live lewat query
+# param (?tahun=&kecamatan=&kelurahan=).
+QUERY_FILTER_KEYS = ('tahun', 'kecamatan', 'kelurahan')
+
+def snapshot_keys(cube):
+    """FilterKeys covered by the static snapshot: the default view and every kecamatan, per year"""
+    for year in cube.years:
+        yield FilterKey(year=year)
+        for kecamatan in cube.hierarchy[year].kecamatan:
+            yield FilterKey(year=year, kecamatan=(kecamatan,))
+
+def snapshot_bundle(cube, key, top_n=TOP_N_DEFAULT):
+    """KPI values, detail tables and figure specs of one single-year view, JSON-ready"""
+    selection = select_key(cube, key)
+    summary = compute_summary(selection, cube)
+    ranking = kelurahan_ranking(cube, key)
+    figures = {
+        'spark_total': total_sparkline_spec(summary),
+        'spark_produktif': produktif_donut_spec(summary),
+        'spark_dependensi': dependency_gauge_spec(summary),
+        'spark_kecamatan': top_kecamatan_sparkline_spec(summary),
+        'trend': year_trend_spec(year_sex_frame(cube)),
+        'pyramid': population_pyramid_spec(*pyramid_inputs(cube, key)),
+        'kecamatan': kecamatan_bar_spec(selection.kecamatan_sex_frame()),
+        'gender': gender_pie_spec(selection.sex_frame()),
+        'kelurahan': kelurahan_bar_spec(ranking, top_n),
+    }
+    if summary.has_previous:
+        figures['spark_growth'] = growth_sparkline_spec(summary)
+    return {
+        'key': key._asdict(),
+        'summary': asdict(summary),
+        'kelurahan_table': [
+            {'Kecamatan': ranking.kecamatan[i], 'Kelurahan': ranking.kelurahan[i], 'Total Penduduk': int(ranking.totals[i])}
+            for i in ranking.order
+        ],
+        'age_band_table': age_band_table(cube, key, age_band_rows()).to_dict('records'),
+        'figures': figures,
+    }
+
+def apply_query_filters(cube):
+    """Seed the single-year filters from the URL once per session (link balik dari snapshot statis)"""
+    if st.session_state.get('query_filters_applied'):
+        return
+    st.session_state['query_filters_applied'] = True
+    params = st.query_params
+    year = params.get('tahun')
+    if year in cube.year_code:
+        st.session_state['filter_year'] = year
+    else:
+        year = max(cube.years)
+    hierarchy = cube.hierarchy[year]
+    kecamatan = [k for k in params.get_all('kecamatan') if k in hierarchy.kecamatan]
+    if kecamatan:
+        st.session_state['filter_kecamatan'] = kecamatan
+    kelurahan = set(hierarchy.kelurahan_options(tuple(kecamatan)))
+    kelurahan = [k for k in params.get_all('kelurahan') if k in kelurahan]
+    if kelurahan:
+        st.session_state['filter_kelurahan'] = kelurahan
+
+# ===== CLIENT-SIDE MODE =====
+# ?mode=client (atau DASHBOARD_CLIENT_MODE=1): cube dikirim sekali ke browser sebagai
+# array uint32 base64 dan viewer.html menghitung semua filter single tahun di JS dari
+# prefix sum umur. Interaksi tidak memicu rerun; server hanya menyajikan halaman awal.
+VIEWER_TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'viewer.html')
+CLIENT_MODE = os.environ.get('DASHBOARD_CLIENT_MODE', '') not in ('', '0')
+CLIENT_VIEW_HEIGHT = 3600
+PLOTLY_CDN = f'https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js'
+
+def client_payload(cube, live_url=None, in_streamlit=False, top_n=TOP_N_DEFAULT):
+    """Cube counts + labels + figure templates for viewer.html's cube source, JSON-ready"""
+    # Jumlah penduduk per sel muat di uint32; little-endian sama dengan typed array browser
+    dtype = '<u4' if cube.counts.max(initial=0) < 2 ** 32 else '<f8'
+    default = snapshot_bundle(cube, FilterKey(year=cube.years[-1]), top_n)
+    figures = default['figures']
+    # Template sparkline growth selalu ikut walau tahun default tidak punya tahun sebelumnya
+    figures.setdefault('spark_growth', growth_sparkline_spec(summary_for(cube, FilterKey(year=cube.years[-1]))))
+    return {
+        'type': 'cube',
+        'data_version': cube.version,
+        'live_url': live_url,
+        'in_streamlit': in_streamlit,
+        'template': pio.templates[pio.templates.default].to_plotly_json(),
+        'years': list(cube.years),
+        'kecamatan': list(cube.kecamatan),
+        'kelurahan': list(cube.kelurahan),
+        'wilayah_kecamatan': cube.wilayah_kecamatan.tolist(),
+        'max_age': MAX_AGE,
+        'counts': base64.b64encode(cube.counts.astype(dtype).tobytes()).decode('ascii'),
+        'counts_dtype': 'uint32' if dtype == '<u4' else 'float64',
+        'present': base64.b64encode(cube.present.astype(np.uint8).tobytes()).decode('ascii'),
+        'age_groupings': AGE_GROUPINGS,
+        'age_grouping_default': AGE_GROUPING_DEFAULT,
+        'age_bands': age_band_rows(),
+        'top_n': top_n,
+        'figures': figures,
+    }
+
+def render_viewer(source, plotly_src):
+    """viewer.html with its data source (snapshot manifest or cube payload) filled in"""
+    with open(VIEWER_TEMPLATE, encoding='utf-8') as f:
+        template = f.read()
+    # "</" di dalam JSON bisa menutup tag <script> lebih awal
+    payload = figure_json(source).decode('utf-8').replace('</', '<\\/')
+    return template.replace('{{PLOTLY_SRC}}', plotly_src).replace('{{SOURCE}}', payload)
+
+@st.cache_resource
+def client_view_html():
+    """Client-side viewer page, built once per process and shared by every session"""
+    return render_viewer(client_payload(load_cube(), in_streamlit=True), PLOTLY_CDN)
 
 def main():
-    df = load_data()
+    perf_recorder().start_run(_session_id())
+    with perf_step('load_data') as info:
+        df = load_data()
+        if df is not None:
+            info['rows'], info['bytes'] = len(df), int(df.memory_usage(index=False).sum())
+    with perf_step('load_cube'):
+        cube = load_cube()
     
-    if df is None:
+    if df is None or cube is None:
         st.error("❌ Gagal memuat data!")
         st.info("Pastikan file 'DATA PROJECT.xlsx' ada di folder 'data/'")
         st.stop()
     
+    if CLIENT_MODE or st.query_params.get('mode') == 'client':
+        # Semua filter berjalan di browser; tidak ada widget Streamlit yang memicu rerun
+        components.html(client_view_html(), height=CLIENT_VIEW_HEIGHT, scrolling=True)
+        return
+    
     st.title("📊 Dashboard Kependudukan Kota Samarinda")
     st.markdown("**Analisis Data Penduduk Tahun 2022-2024**")
     st.markdown("---")
@@ -299,10 +2357,12 @@ def main():
     
     if dashboard_mode == "Analisis Single Tahun":
         st.sidebar.subheader("📅 Pilih Tahun")
-        available_years = sorted(df['tahun'].unique(), reverse=True)
-        selected_year = st.sidebar.selectbox("Tahun:", available_years)
+        apply_query_filters(cube)
+        available_years = sorted(cube.years, reverse=True)
+        selected_year = st.sidebar.selectbox("Tahun:", available_years, key='filter_year')
         
-        df_year = df[df['tahun'] == selected_year].copy()
+        # Pilihan wilayah dibaca dari hierarki kecamatan -> kelurahan tahun terpilih
+        hierarchy = cube.hierarchy[selected_year]
         
         st.markdown(f"### 📊 Data Tahun **{selected_year}**")
         st.markdown("---")
@@ -311,32 +2371,25 @@ def main():
         
         st.sidebar.info("🏙️ **Kota:** Samarinda")
         
-        # Kecamatan filter - selectbox
-        all_kecamatan = ['Semua Kecamatan'] + sorted(df_year['kecamatan'].unique())
-        selected_kecamatan = st.sidebar.selectbox(
+        # Kecamatan filter - multiselect, kosong = semua kecamatan
+        keep_valid_choices('filter_kecamatan', hierarchy.kecamatan)
+        selected_kecamatan = st.sidebar.multiselect(
             "🏘️ Pilih Kecamatan:",
-            options=all_kecamatan,
-            index=0
+            options=hierarchy.kecamatan,
+            placeholder="Semua Kecamatan",
+            key='filter_kecamatan'
         )
         
-        # Filter df based on kecamatan
-        if selected_kecamatan != 'Semua Kecamatan':
-            df_filtered = df_year[df_year['kecamatan'] == selected_kecamatan].copy()
-        else:
-            df_filtered = df_year.copy()
-        
         # Kelurahan filter (based on selected kecamatan)
-        available_kelurahan = ['Semua Kelurahan'] + sorted(df_filtered['kelurahan'].unique())
-        selected_kelurahan = st.sidebar.selectbox(
+        available_kelurahan = hierarchy.kelurahan_options(selected_kecamatan)
+        keep_valid_choices('filter_kelurahan', available_kelurahan)
+        selected_kelurahan = st.sidebar.multiselect(
             "🏡 Pilih Kelurahan:",
             options=available_kelurahan,
-            index=0
+            placeholder="Semua Kelurahan",
+            key='filter_kelurahan'
         )
         
-        # Final filter
-        if selected_kelurahan != 'Semua Kelurahan':
-            df_filtered = df_filtered[df_filtered['kelurahan'] == selected_kelurahan].copy()
-        
         # Age range filter - HARDCODE MAX KE 75
         st.sidebar.markdown("---")
         st.sidebar.subheader("👶👴 Filter Umur")
@@ -355,273 +2408,57 @@ def main():
         # Display caption
         st.sidebar.caption(f"Range terpilih: {age_range[0]} - 75+ tahun")
         
-        # Apply age filter TERAKHIR
-        df_filtered = df_filtered[
-            (df_filtered['umur'] >= age_range[0]) & 
-            (df_filtered['umur'] <= age_range[1])
-        ].copy()
-        
-        # ===== METRICS BARU - LEBIH INSIGHTFUL =====
-        st.header("📊 Ringkasan Data")
-        
-        # Calculate metrics
-        total_pop = df_filtered['jumlah'].sum()
-        
-        # Pertumbuhan penduduk (vs tahun sebelumnya)
-        prev_year = str(int(selected_year) - 1)
-        if prev_year in df['tahun'].values:
-            df_prev = df[df['tahun'] == prev_year]
-            total_prev = df_prev['jumlah'].sum()
-            growth = total_pop - total_prev
-            growth_pct = (growth / total_prev * 100) if total_prev > 0 else 0
-        else:
-            growth = 0
-            growth_pct = 0
-        
-        # Usia produktif (15-64 tahun)
-        df_produktif = df_filtered[(df_filtered['umur'] >= 15) & (df_filtered['umur'] <= 64)]
-        usia_produktif = df_produktif['jumlah'].sum()
-        pct_produktif = (usia_produktif / total_pop * 100) if total_pop > 0 else 0
-        
-        # Rasio dependensi: (anak 0-14 + lansia 65+) / produktif * 100
-        df_anak = df_filtered[df_filtered['umur'] < 15]
-        df_lansia = df_filtered[df_filtered['umur'] >= 65]
-        dependents = df_anak['jumlah'].sum() + df_lansia['jumlah'].sum()
-        rasio_dependensi = (dependents / usia_produktif * 100) if usia_produktif > 0 else 0
-        
-        # Kecamatan terbesar
-        kec_largest = df_filtered.groupby('kecamatan')['jumlah'].sum().idxmax()
-        kec_largest_pop = df_filtered.groupby('kecamatan')['jumlah'].sum().max()
-        
-        # Display metrics dengan mini charts
-        col1, col2, col3, col4, col5 = st.columns(5)
-        
-        with col1:
-            st.metric(
-                "👥 Total Penduduk",
-                format_number(total_pop)
-            )
-            # Mini sparkline untuk trend total (3 tahun terakhir)
-            years_trend = sorted([y for y in df['tahun'].unique()])[-3:]
-            trend_data = [df[df['tahun'] == y]['jumlah'].sum() for y in years_trend]
-            
-            fig_spark1 = go.Figure()
-            fig_spark1.add_trace(go.Scatter(
-                x=years_trend,
-                y=trend_data,
-                mode='lines',
-                line=dict(color='#3498db', width=2),
-                fill='tozeroy',
-                fillcolor='rgba(52, 152, 219, 0.2)'
-            ))
-            fig_spark1.update_layout(
-                height=80,
-                margin=dict(l=0, r=0, t=0, b=0),
-                xaxis=dict(visible=False),
-                yaxis=dict(visible=False),
-                showlegend=False,
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)'
-            )
-            st.plotly_chart(fig_spark1, use_container_width=True, config={'displayModeBar': False})
-        
-        with col2:
-            if selected_year != '2022':
-                st.metric(
-                    "📈 Pertumbuhan",
-                    f"{growth_pct:+.2f}%",
-                    delta=f"{growth:+,} jiwa"
-                )
-            else:
-                st.metric(
-                    "📈 Pertumbuhan",
-                    "N/A",
-                )
-                st.caption("Data tahun sebelumnya tidak tersedia")
-            
-            # Mini bar chart untuk growth
-            if selected_year != '2022':
-                fig_spark2 = go.Figure()
-                fig_spark2.add_trace(go.Bar(
-                    x=['2022', '2023', '2024'][:int(selected_year)-2021],
-                    y=[0, 1.43, 2.25][:int(selected_year)-2021] if selected_year != '2022' else [0],
-                    marker=dict(color=['#e74c3c' if x < 0 else '#2ecc71' for x in [0, 1.43, 2.25][:int(selected_year)-2021]])
-                ))
-                fig_spark2.update_layout(
-                    height=80,
-                    margin=dict(l=0, r=0, t=0, b=0),
-                    xaxis=dict(visible=False),
-                    yaxis=dict(visible=False),
-                    showlegend=False,
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)'
-                )
-                st.plotly_chart(fig_spark2, use_container_width=True, config={'displayModeBar': False})
-        
-        with col3:
-            st.metric(
-                "💼 Usia Produktif",
-                format_number(usia_produktif)
-            )
-            st.caption(f"{pct_produktif:.1f}% dari total")
-            
-            # Mini donut chart
-            fig_spark3 = go.Figure()
-            fig_spark3.add_trace(go.Pie(
-                values=[usia_produktif, total_pop - usia_produktif],
-                hole=0.6,
-                marker=dict(colors=['#3498db', '#ecf0f1']),
-                textinfo='none',
-                hoverinfo='skip'
-            ))
-            fig_spark3.update_layout(
-                height=80,
-                margin=dict(l=0, r=0, t=0, b=0),
-                showlegend=False,
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)'
-            )
-            st.plotly_chart(fig_spark3, use_container_width=True, config={'displayModeBar': False})
-        
-        with col4:
-            st.metric(
-                "👶👴 Rasio Dependensi",
-                f"{rasio_dependensi:.1f}",
-            )
-            st.caption("per 100 produktif")
-            
-            # Mini gauge chart
-            fig_spark4 = go.Figure()
-            fig_spark4.add_trace(go.Indicator(
-                mode="gauge",  # Hilangkan "+number" agar angka tidak muncul
-                value=rasio_dependensi,
-                domain={'x': [0, 1], 'y': [0, 1]},
-                gauge={
-                    'axis': {'range': [None, 100], 'visible': False},
-                    'bar': {'color': "#e74c3c" if rasio_dependensi > 50 else "#f39c12" if rasio_dependensi > 40 else "#2ecc71"},
-                    'bgcolor': "rgba(0,0,0,0)",
-                    'borderwidth': 0,
-                }
-            ))
-            fig_spark4.update_layout(
-                height=60,
-                margin=dict(l=0, r=0, t=0, b=0),
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)'
-            )
-            st.plotly_chart(fig_spark4, use_container_width=True, config={'displayModeBar': False})
+        # Semua filter sekaligus jadi satu key; tiap section slicing cube sendiri
+        key = FilterKey(
+            year=selected_year,
+            kecamatan=tuple(sorted(selected_kecamatan)),
+            kelurahan=tuple(sorted(selected_kelurahan)),
+            age_range=tuple(age_range),
+        )
         
-        with col5:
-            st.metric(
-                "🏘️ Kecamatan Terbesar",
-                kec_largest[:12] + "..." if len(kec_largest) > 12 else kec_largest,
-            )
-            st.caption(f"{format_number(kec_largest_pop)} jiwa")
-            
-            # Mini bar chart top 3 kecamatan
-            top3_kec = df_filtered.groupby('kecamatan')['jumlah'].sum().nlargest(3)
-            fig_spark5 = go.Figure()
-            fig_spark5.add_trace(go.Bar(
-                x=top3_kec.values,
-                y=[k[:10] for k in top3_kec.index],
-                orientation='h',
-                marker=dict(color='#3498db')
-            ))
-            fig_spark5.update_layout(
-                height=80,
-                margin=dict(l=0, r=0, t=0, b=0),
-                xaxis=dict(visible=False),
-                yaxis=dict(visible=False),
-                showlegend=False,
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)'
-            )
-            st.plotly_chart(fig_spark5, use_container_width=True, config={'displayModeBar': False})
+        # Slider Top N, pilihan kelompok umur & tabel detail ada di dalam fragment; nilainya
+        # dibaca dari session_state. Section yang tertutup tidak ikut dibangun.
+        st.session_state['figure_timings'] = prebuild_single_year(
+            cube, key,
+            st.session_state.get('top_n', TOP_N_DEFAULT) if st.session_state.get('show_kelurahan') else None,
+            st.session_state.get('age_grouping', AGE_GROUPING_DEFAULT),
+            st.session_state.get('detail_view')
+        )
         
-        # Sex ratio info box (tidak di metrics utama, tapi tetap ada)
-        if total_pop > 0:
-            total_male = df_filtered[df_filtered['kelamin'] == 'L']['jumlah'].sum()
-            total_female = df_filtered[df_filtered['kelamin'] == 'P']['jumlah'].sum()
-            if total_female > 0:
-                sex_ratio = (total_male / total_female * 100)
-                st.info(f"**Rasio Jenis Kelamin:** {sex_ratio:.2f} laki-laki per 100 perempuan")
+        # ===== METRICS BARU - LEBIH INSIGHTFUL =====
+        render_summary_section(cube, key)
         
         st.markdown("---")
         
         # Population Trend
-        st.header("📈 Trend Pertumbuhan Penduduk")
-        st.markdown("*Pertumbuhan populasi dari tahun ke tahun*")
-        fig_trend = create_year_trend_chart(df)
-        st.plotly_chart(fig_trend, use_container_width=True)
+        render_trend_section()
         
         st.markdown("---")
         
         # Piramida Penduduk
-        st.header("👥 Piramida Penduduk")
-        fig_pyramid = create_population_pyramid(df_filtered)
-        st.plotly_chart(fig_pyramid, use_container_width=True)
+        render_pyramid_section(key)
         
         st.markdown("---")
         
         # Kecamatan and Gender
-        col_left, col_right = st.columns([2, 1])
-        
-        with col_left:
-            st.header("🏘️ Analisis Per Kecamatan")
-            fig_kec = create_kecamatan_bar_chart(df_filtered)
-            st.plotly_chart(fig_kec, use_container_width=True)
-        
-        with col_right:
-            st.header("⚧️ Distribusi Gender")
-            fig_gender = create_gender_pie_chart(df_filtered)
-            st.plotly_chart(fig_gender, use_container_width=True)
+        render_kecamatan_gender_section(key)
         
         st.markdown("---")
         
-        st.header("🏡 Analisis Per Kelurahan")
-        top_n = st.slider("Tampilkan Top N Kelurahan:", 10, 30, 15)
-        fig_kel = create_kelurahan_bar_chart(df_filtered, top_n)
-        st.plotly_chart(fig_kel, use_container_width=True)
+        render_kelurahan_section(key)
         
         st.markdown("---")
         
         # HAPUS CHART DISTRIBUSI UMUR (redundant dengan piramida)
         
-        st.header("📋 Tabel Data Detail")
-        
-        tab1, tab2, tab3 = st.tabs(["Per Kecamatan", "Per Kelurahan", "Data Mentah"])
-        
-        with tab1:
-            summary_kec = df_filtered.groupby('kecamatan').agg({
-                'jumlah': 'sum'
-            }).reset_index().sort_values('jumlah', ascending=False)
-            summary_kec.columns = ['Kecamatan', 'Total Penduduk']
-            st.dataframe(summary_kec, use_container_width=True, hide_index=True)
-        
-        with tab2:
-            summary_kel = df_filtered.groupby(['kecamatan', 'kelurahan']).agg({
-                'jumlah': 'sum'
-            }).reset_index().sort_values('jumlah', ascending=False)
-            summary_kel.columns = ['Kecamatan', 'Kelurahan', 'Total Penduduk']
-            st.dataframe(summary_kel, use_container_width=True, hide_index=True)
-        
-        with tab3:
-            st.dataframe(df_filtered, use_container_width=True, hide_index=True)
-            
-            csv = df_filtered.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                "📥 Download Data CSV",
-                csv,
-                f'data_kependudukan_{selected_year}_filtered.csv',
-                'text/csv'
-            )
+        render_detail_tables_section(df, key)
     
     else:  # Mode Perbandingan Multi Tahun
         st.markdown("### 📊 Perbandingan Antar Tahun")
         st.markdown("---")
         
         st.sidebar.subheader("📅 Pilih Tahun untuk Dibandingkan")
-        available_years = sorted(df['tahun'].unique())
+        available_years = list(cube.years)
         selected_years = st.sidebar.multiselect(
             "Tahun:",
             options=available_years,
@@ -632,19 +2469,16 @@ def main():
             st.warning("⚠️ Pilih minimal 1 tahun untuk analisis")
             st.stop()
         
-        df_comparison = df[df['tahun'].isin(selected_years)].copy()
+        years = tuple(sorted(selected_years))
+        year_table, kec_growth = comparison_tables(years)
         
         st.header("📊 Ringkasan Per Tahun")
         
-        cols = st.columns(len(selected_years))
+        cols = st.columns(len(years))
         
-        for idx, year in enumerate(sorted(selected_years)):
-            df_year_comp = df_comparison[df_comparison['tahun'] == year]
-            total = df_year_comp['jumlah'].sum()
-            male = df_year_comp[df_year_comp['kelamin'] == 'L']['jumlah'].sum()
-            female = df_year_comp[df_year_comp['kelamin'] == 'P']['jumlah'].sum()
-            
-            with cols[idx]:
+        per_year = year_table[['Tahun', 'Total Penduduk', 'Laki-laki', 'Perempuan']].itertuples(index=False)
+        for col, (year, total, male, female) in zip(cols, per_year):
+            with col:
                 st.metric(f"📅 Tahun {year}", format_number(total))
                 st.caption(f"♂️ {format_number(male)}")
                 st.caption(f"♀️ {format_number(female)}")
@@ -653,42 +2487,28 @@ def main():
         
         st.header("📈 Trend Populasi Antar Tahun")
         
-        df_years_selected = df[df['tahun'].isin(selected_years)]
-        fig_trend_comp = create_year_trend_chart(df_years_selected)
-        st.plotly_chart(fig_trend_comp, use_container_width=True)
+        show_figure(comparison_trend_figure(years))
         
         st.markdown("---")
         
-        st.header("📋 Tabel Perbandingan Detail")
-        
-        summary_years = df_comparison.groupby('tahun').agg({
-            'jumlah': 'sum',
-            'kecamatan': 'nunique',
-            'kelurahan': 'nunique'
-        }).reset_index()
+        if len(years) > 1:
+            st.header("🏘️ Pertumbuhan Per Kecamatan")
+            show_figure(kecamatan_growth_figure(years))
+            st.caption(f"Pertumbuhan dihitung dari tahun {years[0]} ke {years[-1]}")
+            st.markdown("---")
         
-        male_counts = df_comparison[df_comparison['kelamin'] == 'L'].groupby('tahun')['jumlah'].sum()
-        female_counts = df_comparison[df_comparison['kelamin'] == 'P'].groupby('tahun')['jumlah'].sum()
+        render_comparison_tables_section(years)
         
-        summary_years['laki_laki'] = summary_years['tahun'].map(male_counts)
-        summary_years['perempuan'] = summary_years['tahun'].map(female_counts)
-        
-        summary_years.columns = ['Tahun', 'Total Penduduk', 'Jumlah Kecamatan', 
-                                'Jumlah Kelurahan', 'Laki-laki', 'Perempuan']
-        
-        summary_years = summary_years.sort_values('Tahun')
-        summary_years['Pertumbuhan (%)'] = summary_years['Total Penduduk'].pct_change() * 100
-        
-        st.dataframe(summary_years, use_container_width=True, hide_index=True)
-        
-        csv_comp = df_comparison.to_csv(index=False).encode('utf-8')
-        st.download_button(
+        export_download_button(
             "📥 Download Data Perbandingan",
-            csv_comp,
-            'data_comparison_multi_year.csv',
-            'text/csv'
+            'data_comparison_multi_year',
+            lambda fmt: comparison_export(tuple(sorted(selected_years)), fmt),
+            key='download_comparison'
         )
     
+    if flag_enabled(st.query_params.get('debug')) or DEBUG_ENABLED:
+        render_debug_panel()
+    
     st.markdown("---")
     st.markdown("""
     <div style='text-align: center; color: gray;'>
@@ -0,0 +1,403 @@
+"""Headless load test: N concurrent dashboard sessions running interaction scripts.
+
+Each session is an AppTest instance on its own thread inside one process, the
+way one Streamlit server runs every session's reruns on threads sharing the
+process caches. Sessions replay scripted interactions (ganti tahun, pilih
+kecamatan/kelurahan, geser slider umur, buka tabel/grafik on-demand, mode
+Perbandingan Multi Tahun, download) and the harness reports latency percentiles per action (split into
+waiting for the runner and running), throughput and process memory over time.
+
+AppTest installs one global Runtime per run, so reruns of different sessions
+cannot overlap inside one process: they queue on a single runner slot. The
+numbers therefore describe serialized reruns (a queue in front of one runner),
+not a Streamlit server running sessions' reruns at the same time; the report
+says so in meta.rerun_model. Throughput counts successful interactions only,
+without page loads and errored actions.
+
+    python load_test.py                                   # 8 session, 30 aksi per session
+    python load_test.py --sessions 16 --actions 50 --think-ms 500 --output load.json
+    python load_test.py --scripts wilayah umur --compare load_before.json
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import streamlit.logger
+
+# Import dashboard di luar `streamlit run` memunculkan warning "bare mode"; download
+# dipanggil di luar rerun, jadi cache_data juga memperingatkan "No runtime found".
+# Pakai filter, karena AppTest mengembalikan level logger dari config setiap run
+streamlit.logger.set_log_level('error')
+logging.getLogger('streamlit.runtime.caching.cache_data_api').addFilter(lambda record: record.levelno >= logging.ERROR)
+
+from streamlit.testing.v1 import AppTest
+
+import dashboard_samarinda as dash
+from serving_profile import APP_FILE, memory_kb
+
+DEFAULT_SESSIONS = 8
+DEFAULT_ACTIONS = 30
+MEMORY_INTERVAL_S = 0.5
+PERCENTILES = (50, 90, 95, 99)
+MODE_SINGLE = "Analisis Single Tahun"
+MODE_COMPARISON = "Perbandingan Multi Tahun"
+
+# Satu slot runner per proses (lihat docstring); waktu tunggu per thread dicatat terpisah
+RUNNER_LOCK = threading.Lock()
+RERUN_MODEL = ('serialized: satu slot runner per proses, rerun antar session tidak pernah overlap; '
+               'latency = antre + rerun, bukan server Streamlit yang melayani session bersamaan')
+_queue = threading.local()
+
+
+@contextmanager
+def runner_slot():
+    """Hold the process' single script runner; the wait is added to this thread's queue time"""
+    start = time.perf_counter()
+    with RUNNER_LOCK:
+        _queue.ms = getattr(_queue, 'ms', 0.0) + (time.perf_counter() - start) * 1000
+        yield
+
+
+def rerun(at):
+    with runner_slot():
+        at.run()
+
+
+# ===== INTERACTION SCRIPTS =====
+# Tiap script = daftar aksi (nama, fungsi(at, rng)); fungsi mengubah widget lalu
+# mengembalikan True kalau perlu rerun (download tidak memicu rerun di browser).
+def _mode(at, mode):
+    radio = at.sidebar.radio[0]
+    if radio.value != mode:
+        radio.set_value(mode)
+    return True
+
+
+def _single(at):
+    """Back to the single-year view if a previous action left the session elsewhere"""
+    if at.sidebar.radio[0].value != MODE_SINGLE:
+        at.sidebar.radio[0].set_value(MODE_SINGLE)
+        rerun(at)
+
+
+def switch_year(at, rng):
+    _single(at)
+    year = at.selectbox(key='filter_year')
+    year.select(rng.choice([y for y in year.options if y != year.value] or year.options))
+    return True
+
+
+def pick_kecamatan(at, rng):
+    _single(at)
+    kecamatan = at.multiselect(key='filter_kecamatan')
+    kecamatan.set_value(rng.sample(kecamatan.options, rng.choice((1, 1, 2))))
+    return True
+
+
+def pick_kelurahan(at, rng):
+    _single(at)
+    kelurahan = at.multiselect(key='filter_kelurahan')
+    kelurahan.set_value(rng.sample(kelurahan.options, min(len(kelurahan.options), rng.choice((1, 2, 3)))))
+    return True
+
+
+def clear_wilayah(at, rng):
+    _single(at)
+    at.multiselect(key='filter_kelurahan').set_value([])
+    at.multiselect(key='filter_kecamatan').set_value([])
+    return True
+
+
+def drag_age(at, rng):
+    # Geser slider di browser = satu rerun per posisi yang dilepas
+    _single(at)
+    lo, hi = at.sidebar.slider[0].value
+    lo = max(0, min(lo + rng.choice((-10, -5, 5, 10)), hi - 1))
+    at.sidebar.slider[0].set_range(lo, hi)
+    return True
+
+
+def reset_age(at, rng):
+    _single(at)
+    at.sidebar.slider[0].set_range(0, dash.MAX_AGE)
+    return True
+
+
+def toggle_kelurahan(at, rng):
+    _single(at)
+    toggle = at.toggle(key='show_kelurahan')
+    toggle.set_value(not toggle.value)
+    return True
+
+
+def open_detail_view(at, rng):
+    # Tabel detail dihitung saat view-nya dibuka
+    _single(at)
+    at.radio(key='detail_view').set_value(rng.choice(dash.DETAIL_VIEWS))
+    return True
+
+
+def download_filtered(at, rng):
+    # Download dengan data callable dibangun di request terpisah saat diklik, tanpa rerun
+    # script; AppTest tidak bisa mengklik download_button, jadi builder-nya dipanggil langsung
+    _single(at)
+    fmt = rng.choice(list(dash.EXPORT_FORMATS))
+    key = dash.FilterKey(
+        year=at.selectbox(key='filter_year').value,
+        kecamatan=tuple(sorted(at.multiselect(key='filter_kecamatan').value)),
+        kelurahan=tuple(sorted(at.multiselect(key='filter_kelurahan').value)),
+        age_range=tuple(at.sidebar.slider[0].value),
+    )
+    with runner_slot():
+        dash.filtered_export(key, fmt)
+    return False
+
+
+def open_comparison(at, rng):
+    return _mode(at, MODE_COMPARISON)
+
+
+def pick_comparison_years(at, rng):
+    if at.sidebar.radio[0].value != MODE_COMPARISON:
+        _mode(at, MODE_COMPARISON)
+        rerun(at)
+    years = at.sidebar.multiselect[0]
+    years.set_value(sorted(rng.sample(years.options, rng.randint(2, len(years.options)))))
+    return True
+
+
+def open_comparison_view(at, rng):
+    if at.sidebar.radio[0].value != MODE_COMPARISON:
+        return open_comparison(at, rng)
+    at.radio(key='comparison_view').set_value(rng.choice(dash.COMPARISON_VIEWS))
+    return True
+
+
+def download_comparison(at, rng):
+    if at.sidebar.radio[0].value != MODE_COMPARISON:
+        return open_comparison(at, rng)
+    years = tuple(sorted(at.sidebar.multiselect[0].value))
+    with runner_slot():
+        dash.comparison_export(years, rng.choice(list(dash.EXPORT_FORMATS)))
+    return False
+
+
+def close_comparison(at, rng):
+    return _mode(at, MODE_SINGLE)
+
+
+SCRIPTS = {
+    'tahun': [('switch_year', switch_year)],
+    'wilayah': [('pick_kecamatan', pick_kecamatan), ('pick_kelurahan', pick_kelurahan),
+                ('switch_year', switch_year), ('clear_wilayah', clear_wilayah)],
+    'umur': [('drag_age', drag_age)] * 4 + [('reset_age', reset_age)],
+    'perbandingan': [('open_comparison', open_comparison), ('pick_comparison_years', pick_comparison_years),
+                     ('open_comparison_view', open_comparison_view), ('download_comparison', download_comparison),
+                     ('close_comparison', close_comparison)],
+    'tabel': [('toggle_kelurahan', toggle_kelurahan), ('open_detail_view', open_detail_view),
+              ('switch_year', switch_year), ('open_detail_view', open_detail_view)],
+    'download': [('pick_kecamatan', pick_kecamatan), ('download_filtered', download_filtered),
+                 ('clear_wilayah', clear_wilayah), ('download_filtered', download_filtered)],
+}
+
+
+# ===== RUNNER =====
+class Results:
+    """Thread-safe log of (t, session, action, latency ms, queue ms, error)"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+        self.memory = []
+
+    def add(self, session, action, latency_ms, error=None):
+        queue_ms, _queue.ms = getattr(_queue, 'ms', 0.0), 0.0
+        with self._lock:
+            self.samples.append((time.perf_counter(), session, action, latency_ms, queue_ms, error))
+
+
+def run_session(index, script, args, results, start_barrier):
+    """One simulated user: cold page load, then args.actions scripted interactions"""
+    rng = random.Random(args.seed + index)
+    at = AppTest.from_file(APP_FILE, default_timeout=args.timeout)
+    start_barrier.wait()
+    start = time.perf_counter()
+    rerun(at)
+    results.add(index, 'page_load', (time.perf_counter() - start) * 1000,
+                str(at.exception[0].message) if at.exception else None)
+
+    for name, action in itertools.islice(itertools.cycle(SCRIPTS[script]), args.actions):
+        if args.think_ms:
+            time.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1000)
+        start = time.perf_counter()
+        error = None
+        try:
+            if action(at, rng):
+                rerun(at)
+                if at.exception:
+                    error = str(at.exception[0].message)
+        except Exception as e:  # Widget tidak ditemukan dll.; catat dan lanjut
+            error = f'{type(e).__name__}: {e}'
+        results.add(index, name, (time.perf_counter() - start) * 1000, error)
+
+
+def sample_memory(results, stop, t0):
+    """Record process RSS every MEMORY_INTERVAL_S until stop is set"""
+    while True:
+        usage = memory_kb()
+        results.memory.append((time.perf_counter() - t0, usage.get('rss', 0) / 1024))
+        if stop.wait(MEMORY_INTERVAL_S):
+            return
+
+
+def latency_stats(samples):
+    """Percentiles of (latency, queue wait) pairs in ms"""
+    values = sorted(latency for latency, _ in samples)
+    queue = sorted(wait for _, wait in samples)
+    stats = {'count': len(values), 'mean_ms': statistics.fmean(values), 'max_ms': values[-1],
+             'queue_mean_ms': statistics.fmean(queue), 'queue_p95_ms': dash.percentile(queue, 95)}
+    stats.update({f'p{pct}_ms': dash.percentile(values, pct) for pct in PERCENTILES})
+    return stats
+
+
+def run_load_test(args):
+    """Run every session concurrently; returns the report dict"""
+    scripts = [args.scripts[i % len(args.scripts)] for i in range(args.sessions)]
+    results = Results()
+    start_barrier = threading.Barrier(args.sessions + 1)
+    stop = threading.Event()
+    t0 = time.perf_counter()
+    sampler = threading.Thread(target=sample_memory, args=(results, stop, t0), daemon=True)
+    sampler.start()
+
+    threads = [threading.Thread(target=run_session, args=(i, script, args, results, start_barrier))
+               for i, script in enumerate(scripts)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall_s = time.perf_counter() - start
+    stop.set()
+    sampler.join()
+
+    by_action, ok, errors = {}, [], []
+    for _, session, action, latency, queue_ms, error in results.samples:
+        if error:
+            errors.append((session, action, error))
+            continue
+        by_action.setdefault(action, []).append((latency, queue_ms))
+        ok.append((latency, queue_ms))
+    memory = results.memory
+    # Pertumbuhan memori: RSS akhir vs RSS setelah semua page load pertama selesai
+    first_load_done = max((t for t, _, action, *_ in results.samples if action == 'page_load'), default=t0) - t0
+    settled = [rss for t, rss in memory if t >= first_load_done] or [memory[-1][1]]
+
+    interactions = sum(len(values) for action, values in by_action.items() if action != 'page_load')
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'sessions': args.sessions,
+            'actions': args.actions,
+            'think_ms': args.think_ms,
+            'scripts': scripts,
+            'seed': args.seed,
+            'rerun_model': RERUN_MODEL,
+        },
+        'wall_s': wall_s,
+        # Interaksi sukses saja: page load dan aksi yang error tidak dihitung
+        'interactions_ok': interactions,
+        'interactions_per_s': interactions / wall_s if wall_s else 0,
+        'page_loads': len(by_action.get('page_load', ())),
+        'error_count': len(errors),
+        'overall': latency_stats(ok) if ok else {},
+        'actions': {action: latency_stats(values) for action, values in sorted(by_action.items())},
+        'errors': errors,
+        'memory': {
+            'rss_start_mb': memory[0][1],
+            'rss_after_load_mb': settled[0],
+            'rss_end_mb': memory[-1][1],
+            'rss_peak_mb': max(rss for _, rss in memory),
+            'growth_after_load_mb': memory[-1][1] - settled[0],
+            'timeline': [(round(t, 2), round(rss, 1)) for t, rss in memory],
+        },
+    }
+
+
+def print_report(report, file=sys.stderr):
+    meta = report['meta']
+    print(f"{meta['sessions']} session x {meta['actions']} aksi dalam {report['wall_s']:.1f} s "
+          f"-> {report['interactions_per_s']:.2f} interaksi sukses/s "
+          f"({report['interactions_ok']} interaksi, {report['page_loads']} page load, {report['error_count']} error)",
+          file=file)
+    print("  Rerun diserialisasi lewat satu slot runner: angka ini antrean satu proses, "
+          "bukan server yang melayani session bersamaan", file=file)
+    print(f"  {'aksi (ms)':<22} {'n':>5} " + ' '.join(f"{f'p{p}':>9}" for p in PERCENTILES)
+          + f" {'max':>9} {'antre rata2':>12}", file=file)
+    rows = list(report['actions'].items()) + [('(semua)', report['overall'])]
+    for action, stats in rows:
+        if stats:
+            print(f"  {action:<22} {stats['count']:>5} "
+                  + ' '.join(f"{stats[f'p{p}_ms']:9.1f}" for p in PERCENTILES)
+                  + f" {stats['max_ms']:9.1f} {stats['queue_mean_ms']:12.1f}", file=file)
+    memory = report['memory']
+    print(f"  RSS: awal {memory['rss_start_mb']:.1f} MB, setelah page load {memory['rss_after_load_mb']:.1f} MB, "
+          f"akhir {memory['rss_end_mb']:.1f} MB (puncak {memory['rss_peak_mb']:.1f} MB, "
+          f"pertumbuhan {memory['growth_after_load_mb']:+.1f} MB)", file=file)
+    if report['errors']:
+        print(f"  {len(report['errors'])} error, contoh: {report['errors'][0]}", file=file)
+
+
+def compare(current, previous_path):
+    """Print p50/p95 ratios (current / previous) per action"""
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nPerbandingan vs {previous_path} ({previous['meta']['timestamp']}):")
+    for action, stats in current['actions'].items():
+        old = previous['actions'].get(action)
+        if old:
+            print(f"  {action:<22} p50 {old['p50_ms']:8.1f} -> {stats['p50_ms']:8.1f} ms   "
+                  f"p95 {old['p95_ms']:8.1f} -> {stats['p95_ms']:8.1f} ms")
+    if 'interactions_per_s' in previous:
+        print(f"  interaksi sukses {previous['interactions_per_s']:.2f} -> {current['interactions_per_s']:.2f} /s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=DEFAULT_SESSIONS)
+    parser.add_argument('--actions', type=int, default=DEFAULT_ACTIONS, help='aksi per session setelah page load')
+    parser.add_argument('--think-ms', type=float, default=0, help='jeda rata-rata antar aksi (0 = tanpa jeda)')
+    parser.add_argument('--scripts', nargs='+', choices=list(SCRIPTS), default=list(SCRIPTS),
+                        help='script yang dibagi bergiliran ke session')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=300, help='batas waktu satu rerun (detik)')
+    parser.add_argument('--output', default='load_test_results.json')
+    parser.add_argument('--compare', help='older load test JSON to compare against')
+    args = parser.parse_args(argv)
+
+    os.chdir(os.path.dirname(APP_FILE))
+    report = run_load_test(args)
+    print_report(report)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Hasil ditulis ke {args.output}", file=sys.stderr)
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
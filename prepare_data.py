@@ -0,0 +1,46 @@
+"""Parse new or changed source files into the partition cache ahead of deploy.
+
+The dashboard parses new/changed files itself, one after another, because a
+Streamlit server must not fork its worker processes. Run this script offline
+(before a deploy, or after dropping a new file into data/) to parse several
+files in parallel in spawned worker processes. It also rebuilds the shared
+memory-mapped dataset, so the app starts from a warm cache.
+
+    python prepare_data.py                   # satu worker per CPU
+    python prepare_data.py --workers 4
+"""
+import argparse
+import os
+import sys
+import time
+
+import streamlit.logger
+
+# Import dashboard di luar `streamlit run` memunculkan warning "bare mode"
+streamlit.logger.set_log_level('error')
+
+import dashboard_samarinda as dash
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='proses parse paralel (spawn); 1 = berurutan')
+    args = parser.parse_args(argv)
+
+    paths = dash.find_data_files()
+    start = time.perf_counter()
+    df = dash.load_dataset(paths, workers=max(1, args.workers))
+    elapsed = time.perf_counter() - start
+
+    manifest = dash.load_manifest()
+    for path in paths:
+        report = manifest['files'].get(path, {}).get('report') or {}
+        rejected = sum(report.get('rejected', {}).values())
+        print(f"{path}: {report.get('rows_accepted', 0):,} baris diterima, {rejected:,} ditolak", file=sys.stderr)
+    print(f"{len(df):,} baris ({df['tahun'].nunique()} tahun) di {dash.SHARED_DATASET_PATH} "
+          f"dalam {elapsed:.1f} s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""Measure per-replica memory and rerun latency of the multi-process serving profile.
+
+Starts N replica processes (fresh interpreters, like Streamlit replicas behind a
+load balancer). Each replica runs the dashboard headless through AppTest, then
+reruns it with a fixed filter script. Reported per replica: RSS, PSS (RSS with
+shared pages split across processes), how much of the memory-mapped dataset
+file is resident and shared, rerun latency, and what a st.cache_data style copy
+of the frame would cost per cache hit.
+
+    python serving_profile.py                        # 3 replica, 20 rerun
+    python serving_profile.py --replicas 4 --reruns 50 --output serving.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import pickle
+import platform
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboard_samarinda.py')
+DEFAULT_REPLICAS = 3
+DEFAULT_RERUNS = 20
+DEFAULT_TIMEOUT_S = 600  # batas satu profil; replika yang macet dilaporkan sebagai error
+JOIN_TIMEOUT_S = 10
+
+
+def memory_kb(mapped_path=None):
+    """Rss/Pss/Shared (kB) of this process and of one mapped file, from /proc (Linux only)"""
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                name, value = line.split(':', 1)
+                if name in ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty'):
+                    usage[name.lower()] = int(value.split()[0])
+    except OSError:
+        import resource
+        usage['rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage
+    if mapped_path:
+        mapped = {'rss': 0, 'pss': 0}
+        current = False
+        with open('/proc/self/smaps') as f:
+            for line in f:
+                fields = line.split()
+                if '-' in fields[0] and ':' not in fields[0]:
+                    current = len(fields) >= 6 and os.path.abspath(fields[-1]) == mapped_path
+                elif current and fields[0] in ('Rss:', 'Pss:'):
+                    mapped[fields[0][:-1].lower()] += int(fields[1])
+        usage['dataset_rss'], usage['dataset_pss'] = mapped['rss'], mapped['pss']
+    return usage
+
+
+def interaction_script(at, step):
+    """One rerun of the filter script: ganti tahun, kecamatan, range umur, atau kembali ke default"""
+    years = at.selectbox(key='filter_year').options
+    kecamatan = at.multiselect(key='filter_kecamatan').options
+    action = step % 4
+    if action == 0:
+        at.selectbox(key='filter_year').select(years[step // 4 % len(years)])
+    elif action == 1:
+        at.multiselect(key='filter_kecamatan').set_value([kecamatan[step // 4 % len(kecamatan)]])
+    elif action == 2:
+        at.sidebar.slider[0].set_range(step % 30, 60)
+    else:
+        at.multiselect(key='filter_kecamatan').set_value([])
+        at.sidebar.slider[0].set_range(0, 75)
+    at.run()
+
+
+def replica(index, args, barrier, results):
+    """One replica process: always posts exactly one result, an error if measuring failed"""
+    try:
+        results.put(measure_replica(index, args, barrier))
+    except Exception as e:
+        # Lepaskan replika lain yang menunggu di barrier, supaya profil selesai dengan error
+        barrier.abort()
+        results.put({'replica': index, 'error': f'{type(e).__name__}: {e}'})
+
+
+def measure_replica(index, args, barrier):
+    """Cold run, measure, scripted reruns, measure again"""
+    os.chdir(os.path.dirname(APP_FILE))
+    import streamlit.logger
+    streamlit.logger.set_log_level('error')
+    from streamlit.testing.v1 import AppTest
+    import dashboard_samarinda as dash
+
+    dataset_path = os.path.abspath(dash.SHARED_DATASET_PATH)
+    start_memory = memory_kb()
+    at = AppTest.from_file(APP_FILE, default_timeout=300)
+    start = time.perf_counter()
+    at.run()
+    cold_ms = (time.perf_counter() - start) * 1000
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+    # Semua replika sudah memuat data sebelum PSS diukur, supaya halaman bersama terbagi rata
+    barrier.wait(args.timeout)
+    loaded_memory = memory_kb(dataset_path)
+
+    latencies = []
+    for step in range(args.reruns):
+        start = time.perf_counter()
+        interaction_script(at, step)
+        latencies.append((time.perf_counter() - start) * 1000)
+    barrier.wait(args.timeout)
+    final_memory = memory_kb(dataset_path)
+
+    # Biaya per hit kalau frame dikembalikan lewat st.cache_data (pickle + unpickle per rerun)
+    df = dash.load_data()
+    start = time.perf_counter()
+    copied = pickle.loads(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL))
+    copy_ms = (time.perf_counter() - start) * 1000
+    del copied
+
+    latencies.sort()
+    return {
+        'replica': index,
+        'pid': os.getpid(),
+        'cold_run_ms': cold_ms,
+        'rerun_p50_ms': dash.percentile(latencies, 50),
+        'rerun_p95_ms': dash.percentile(latencies, 95),
+        'rerun_max_ms': latencies[-1],
+        'memory_start_kb': start_memory,
+        'memory_loaded_kb': loaded_memory,
+        'memory_final_kb': final_memory,
+        'frame_bytes': int(df.memory_usage(deep=True).sum()),
+        'cache_data_copy_ms': copy_ms,
+    }
+
+
+def profile(args):
+    """Run every replica concurrently; returns the per-replica results sorted by replica"""
+    # spawn: tiap replika interpreter baru, tidak mewarisi halaman dari parent lewat fork
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(args.replicas)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=replica, args=(i, args, barrier, results)) for i in range(args.replicas)]
+    for process in processes:
+        process.start()
+    collected = {}
+    deadline = time.monotonic() + args.timeout
+    try:
+        while len(collected) < len(processes):
+            result = results.get(timeout=max(0.0, deadline - time.monotonic()))
+            collected[result['replica']] = result
+    except queue.Empty:
+        for i in range(args.replicas):
+            collected.setdefault(i, {'replica': i, 'error': f'tidak selesai dalam {args.timeout:.0f} s'})
+    for process in processes:
+        process.join(JOIN_TIMEOUT_S)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+    return [collected[i] for i in sorted(collected)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--replicas', type=int, default=DEFAULT_REPLICAS)
+    parser.add_argument('--reruns', type=int, default=DEFAULT_RERUNS)
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_S,
+                        help='detik maksimum menunggu semua replika')
+    parser.add_argument('--output', default='serving_profile.json')
+    args = parser.parse_args(argv)
+
+    replicas = profile(args)
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'replicas': args.replicas,
+            'reruns': args.reruns,
+        },
+        'replicas': replicas,
+    }
+    for r in replicas:
+        if 'error' in r:
+            print(f"replika {r['replica']}: ERROR {r['error']}", file=sys.stderr)
+            continue
+        memory = r['memory_final_kb']
+        print(f"replika {r['replica']}: RSS {memory.get('rss', 0) / 1024:6.1f} MB  PSS {memory.get('pss', 0) / 1024:6.1f} MB  "
+              f"dataset map RSS/PSS {memory.get('dataset_rss', 0)}/{memory.get('dataset_pss', 0)} kB  "
+              f"cold {r['cold_run_ms']:7.0f} ms  rerun p50 {r['rerun_p50_ms']:6.1f} ms  p95 {r['rerun_p95_ms']:6.1f} ms  "
+              f"copy/hit cache_data {r['cache_data_copy_ms']:.2f} ms", file=sys.stderr)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Hasil ditulis ke {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
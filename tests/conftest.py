@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import streamlit.logger
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import dashboard di luar `streamlit run` memunculkan warning "bare mode"
+streamlit.logger.set_log_level('error')
+
+import dashboard_samarinda as dash
+
+YEARS = ('2022', '2023', '2024')
+WILAYAH = {
+    'Alpha': ('Alpha Satu', 'Alpha Dua'),
+    'Beta': ('Beta Satu', 'Beta Dua', 'Beta Tiga'),
+    'Gamma': ('Gamma Satu',),
+}
+# Kelurahan yang tidak punya baris sama sekali di satu tahun
+MISSING = ('2023', 'Beta Dua')
+
+
+@pytest.fixture(scope='session')
+def frame():
+    """Synthetic long-format frame: sparse rows, ages 0..MAX_AGE, one wilayah missing in 2023"""
+    rng = np.random.default_rng(7)
+    rows = [
+        (year, kec, kel, sex, umur)
+        for year in YEARS
+        for kec, kelurahan in WILAYAH.items()
+        for kel in kelurahan
+        if (year, kel) != MISSING
+        for sex in dash.SEXES
+        for umur in range(dash.MAX_AGE + 1)
+    ]
+    df = pd.DataFrame(rows, columns=['tahun', 'kecamatan', 'kelurahan', 'kelamin', 'umur'])
+    df['jumlah'] = rng.integers(0, 60, len(df))
+    # Tidak semua sel ada barisnya, seperti di data asli
+    return df[rng.random(len(df)) < 0.8].reset_index(drop=True)
+
+
+@pytest.fixture(scope='session')
+def cube(frame):
+    return dash.build_cube(frame)
@@ -0,0 +1,48 @@
+"""Age groupings and the Kelompok Umur bands, summed from the umur prefix sums"""
+import numpy as np
+import pytest
+
+import dashboard_samarinda as dash
+from conftest import YEARS
+from test_cube import AGE_RANGES, FILTERS, reference
+
+
+@pytest.mark.parametrize('width', [1, 5, 10, 20, 75, 76])
+def test_age_groups_cover_every_age_once(width):
+    bounds = dash.age_groups(width)
+    assert bounds[0][0] == 0
+    assert bounds[-1][1] == dash.MAX_AGE
+    assert all(prev[1] + 1 == lo for prev, (lo, _) in zip(bounds, bounds[1:]))
+    assert all(hi - lo + 1 == width for lo, hi in bounds[:-1])
+
+
+def test_age_labels():
+    assert [dash.age_label(lo, hi) for lo, hi in dash.AGE_GROUPINGS['BPS 10 tahun']] == [
+        '0-9', '10-19', '20-29', '30-39', '40-49', '50-59', '60-69', '70+',
+    ]
+    assert dash.age_label(75, 75) == '75+'
+
+
+@pytest.mark.parametrize('age_range', AGE_RANGES)
+@pytest.mark.parametrize('kecamatan, kelurahan', FILTERS)
+def test_age_band_table_matches_groupby(frame, cube, kecamatan, kelurahan, age_range):
+    key = dash.FilterKey(YEARS[0], kecamatan, kelurahan, age_range)
+    bands = dash.age_band_rows(custom=(0, 0)) + (('Tua', dash.MAX_AGE, dash.MAX_AGE),)
+    table = dash.age_band_table(cube, key, bands)
+
+    rows = reference(frame, key.year, kecamatan, kelurahan, age_range)
+    total = rows['jumlah'].sum()
+    for (name, lo, hi), row in zip(bands, table.itertuples(index=False)):
+        # Band dipotong dengan range umur filter; band di luar range jadi 0
+        band = rows[rows['umur'].between(lo, hi)]
+        by_sex = band.groupby('kelamin')['jumlah'].sum()
+        assert (row.Kelompok, row.Umur) == (name, dash.age_label(lo, hi))
+        assert (row[2], row[3]) == (by_sex.get('L', 0), by_sex.get('P', 0))
+        assert row.Total == band['jumlah'].sum()
+        assert row[5] == pytest.approx(band['jumlah'].sum() / total * 100 if total else 0)
+
+
+def test_band_outside_age_range_is_zero(cube):
+    selection = dash.select_cube(cube, YEARS[0], age_range=(20, 30))
+    np.testing.assert_array_equal(selection.age_band_totals([(0, 19), (31, dash.MAX_AGE)]), 0)
+    assert selection.age_band_totals([(0, dash.MAX_AGE)]).sum() == selection.total()
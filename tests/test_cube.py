@@ -0,0 +1,117 @@
+"""The population cube against a plain pandas groupby on the long-format frame"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import dashboard_samarinda as dash
+from conftest import MISSING, YEARS
+
+AGE_RANGES = [(0, dash.MAX_AGE), (0, 0), (dash.MAX_AGE, dash.MAX_AGE), (0, 14), (13, 64), (60, dash.MAX_AGE)]
+FILTERS = [((), ()), (('Beta',), ()), (('Alpha', 'Gamma'), ()), ((), ('Beta Dua',)), (('Beta',), ('Beta Satu', 'Beta Dua'))]
+
+
+def reference(frame, year, kecamatan=(), kelurahan=(), age_range=(0, dash.MAX_AGE)):
+    """Rows of frame matching one filter, the slow way"""
+    mask = (frame['tahun'] == year) & frame['umur'].between(*age_range)
+    if kecamatan:
+        mask &= frame['kecamatan'].isin(kecamatan)
+    if kelurahan:
+        mask &= frame['kelurahan'].isin(kelurahan)
+    return frame[mask]
+
+
+def selection_totals(selection):
+    """{(kelurahan, kelamin): jumlah} of a selection, non-zero cells only"""
+    return {
+        (kel, sex): int(selection.range_totals[i, s])
+        for i, kel in enumerate(selection.kelurahan)
+        for s, sex in enumerate(dash.SEXES)
+        if selection.range_totals[i, s]
+    }
+
+
+def groupby_totals(rows):
+    totals = rows.groupby(['kelurahan', 'kelamin'])['jumlah'].sum()
+    return {key: int(v) for key, v in totals.items() if v}
+
+
+@pytest.mark.parametrize('year', YEARS)
+@pytest.mark.parametrize('age_range', AGE_RANGES)
+@pytest.mark.parametrize('kecamatan, kelurahan', FILTERS)
+def test_select_cube_matches_groupby(frame, cube, year, kecamatan, kelurahan, age_range):
+    selection = dash.select_cube(cube, year, kecamatan, kelurahan, age_range)
+    rows = reference(frame, year, kecamatan, kelurahan, age_range)
+    assert selection_totals(selection) == groupby_totals(rows)
+    assert selection.total() == rows['jumlah'].sum()
+    np.testing.assert_array_equal(
+        selection.sex_totals(),
+        rows.groupby('kelamin')['jumlah'].sum().reindex(dash.SEXES, fill_value=0),
+    )
+
+
+@pytest.mark.parametrize('year', YEARS)
+@pytest.mark.parametrize('kecamatan, kelurahan', FILTERS)
+def test_present_matches_rows(frame, cube, year, kecamatan, kelurahan):
+    selection = dash.select_cube(cube, year, kecamatan, kelurahan)
+    present = {kel for kel, flag in zip(selection.kelurahan, selection.present) if flag}
+    assert present == set(reference(frame, year, kecamatan, kelurahan)['kelurahan'])
+
+
+def test_missing_wilayah(cube):
+    year, kelurahan = MISSING
+    selection = dash.select_cube(cube, year, (), (kelurahan,))
+    assert selection.total() == 0
+    assert not selection.present.any()
+    assert kelurahan not in dash.select_cube(cube, year).kelurahan_ranking().kelurahan
+    assert kelurahan not in cube.hierarchy[year].all_kelurahan
+    # Tahun berikutnya tidak punya pembanding untuk wilayah ini
+    summary = dash.compute_summary(dash.select_cube(cube, YEARS[YEARS.index(year) + 1], (), (kelurahan,)), cube)
+    assert not summary.has_previous
+    assert summary.growth == 0
+
+
+@pytest.mark.parametrize('year', YEARS)
+@pytest.mark.parametrize('age_range', AGE_RANGES)
+@pytest.mark.parametrize('kecamatan, kelurahan', FILTERS)
+def test_compute_summary_matches_groupby(frame, cube, year, kecamatan, kelurahan, age_range):
+    summary = dash.compute_summary(dash.select_cube(cube, year, kecamatan, kelurahan, age_range), cube)
+    rows = reference(frame, year, kecamatan, kelurahan, age_range)
+    by_sex = rows.groupby('kelamin')['jumlah'].sum()
+    assert summary.total == rows['jumlah'].sum()
+    assert (summary.total_male, summary.total_female) == (by_sex.get('L', 0), by_sex.get('P', 0))
+
+    # Semua kecamatan yang punya baris di tahun ini (juga yang 0 di range umur), urut total
+    # terbesar; yang seri tetap urut nama kecamatan
+    present = sorted(set(reference(frame, year, kecamatan, kelurahan)['kecamatan']))
+    by_kecamatan = (rows.groupby('kecamatan')['jumlah'].sum()
+                    .reindex(present, fill_value=0)
+                    .sort_values(ascending=False, kind='stable'))
+    assert summary.kecamatan_ranking == tuple((kec, int(v)) for kec, v in by_kecamatan.items())
+
+    totals = [reference(frame, y, kecamatan, kelurahan, age_range)['jumlah'].sum() for y in YEARS]
+    assert summary.trend_totals == tuple(totals[-3:])
+    i = YEARS.index(year)
+    has_rows = [len(reference(frame, y, kecamatan, kelurahan)) > 0 for y in YEARS]
+    assert summary.has_previous == (i > 0 and has_rows[i - 1] and totals[i - 1] > 0)
+    if summary.has_previous:
+        assert summary.growth == totals[i] - totals[i - 1]
+        assert summary.growth_pct == pytest.approx((totals[i] - totals[i - 1]) / totals[i - 1] * 100)
+
+
+@pytest.mark.parametrize('grouping', list(dash.AGE_GROUPINGS))
+@pytest.mark.parametrize('age_range', AGE_RANGES)
+@pytest.mark.parametrize('kecamatan, kelurahan', FILTERS)
+def test_pyramid_bins_match_groupby(frame, cube, grouping, kecamatan, kelurahan, age_range):
+    key = dash.FilterKey(YEARS[-1], kecamatan, kelurahan, age_range)
+    totals, labels = dash.pyramid_inputs(cube, key, grouping)
+
+    bounds = dash.AGE_GROUPINGS[grouping]
+    rows = reference(frame, key.year, kecamatan, kelurahan, age_range)
+    edges = [lo for lo, _ in bounds] + [dash.MAX_AGE + 1]
+    bins = pd.cut(rows['umur'], edges, right=False, labels=False)
+    expected = (rows.groupby(['kelamin', bins])['jumlah'].sum()
+                .unstack(fill_value=0)
+                .reindex(index=list(dash.SEXES), columns=range(len(bounds)), fill_value=0))
+    np.testing.assert_array_equal(totals, expected.to_numpy())
+    assert labels[0] == f'0-{bounds[0][1]}'
+    assert labels[-1] == f'{bounds[-1][0]}+'
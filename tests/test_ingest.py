@@ -0,0 +1,56 @@
+"""parse_workbook row validation, rejection counts and wilayah aliases"""
+import csv
+
+import pytest
+
+import dashboard_samarinda as dash
+
+
+def write_csv(path, rows, header=dash.REQUIRED_COLUMNS):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return str(path)
+
+
+def test_validation_and_aliases(tmp_path):
+    path = write_csv(tmp_path / 'penduduk.csv', [
+        (2024, 'samarinda  ulu', 'DADIMULYA', 'L', 10, 5),
+        (2024, 'Samarinda Ulu', 'Dadi Mulya', 'laki-laki', '10', '3.0'),
+        (2024, 'Samarinda Ulu', 'Dadi Mulya', 'P', 80, 2),        # umur >= 75 -> 75
+        (2024, 'Samarinda Ulu', 'Dadi Mulya', 'P', 75, 1),
+        ('', '', '', '', '', ''),                                  # baris kosong dilewati
+        ('dua ribu', 'Samarinda Ulu', 'Dadi Mulya', 'L', 1, 1),
+        (2024, '', 'Dadi Mulya', 'L', 1, 1),
+        (2024, 'Samarinda Ulu', 'Dadi Mulya', 'X', 1, 1),
+        (2024, 'Samarinda Ulu', 'Dadi Mulya', 'L', -1, 1),
+        (2024, 'Samarinda Ulu', 'Dadi Mulya', 'L', 2.5, 1),
+        (2024, 'Samarinda Ulu', 'Dadi Mulya', 'L', 1, -4),
+        (2024, 'Samarinda Ulu', 'Dadi Mulya', 'L', 1, ''),
+    ])
+    report = dash.IngestReport()
+    df = dash.parse_workbook(path, report)
+
+    assert report.rows_read == 11
+    assert report.rows_accepted == 4
+    assert report.rejected == {
+        'tahun tidak valid': 1,
+        'kecamatan/kelurahan kosong': 1,
+        'kelamin tidak dikenal': 1,
+        'umur tidak valid': 2,
+        'jumlah tidak valid': 2,
+    }
+    assert report.aliased == {'DADIMULYA -> Dadi Mulya': 1}
+
+    # Ejaan alias dan nama kanonik jatuh ke sel yang sama
+    assert list(df['kecamatan'].cat.categories) == ['Samarinda Ulu']
+    assert list(df['kelurahan'].cat.categories) == ['Dadi Mulya']
+    cells = {(row.kelamin, row.umur): row.jumlah for row in df.itertuples()}
+    assert cells == {('L', 10): 8, ('P', dash.MAX_AGE): 3}
+
+
+def test_missing_column(tmp_path):
+    path = write_csv(tmp_path / 'penduduk.csv', [(2024, 'A', 'B', 'L', 1)], header=dash.REQUIRED_COLUMNS[:-1])
+    with pytest.raises(ValueError, match='jumlah'):
+        dash.parse_workbook(path)
@@ -0,0 +1,49 @@
+"""SummaryMetrics KPIs against the definitions on the Ringkasan Data cards"""
+import pytest
+
+import dashboard_samarinda as dash
+from conftest import MISSING, YEARS
+from test_cube import AGE_RANGES, FILTERS, reference
+
+
+@pytest.mark.parametrize('age_range', AGE_RANGES)
+@pytest.mark.parametrize('kecamatan, kelurahan', FILTERS)
+def test_kpis(frame, cube, kecamatan, kelurahan, age_range):
+    year = YEARS[-1]
+    summary = dash.compute_summary(dash.select_cube(cube, year, kecamatan, kelurahan, age_range), cube)
+    rows = reference(frame, year, kecamatan, kelurahan, age_range)
+
+    produktif = rows.loc[rows['umur'].between(15, 64), 'jumlah'].sum()
+    dependents = rows.loc[~rows['umur'].between(15, 64), 'jumlah'].sum()
+    total = rows['jumlah'].sum()
+    assert summary.usia_produktif == produktif
+    assert summary.pct_produktif == pytest.approx(produktif / total * 100 if total else 0)
+    assert summary.rasio_dependensi == pytest.approx(dependents / produktif * 100 if produktif else 0)
+    if summary.total_female:
+        assert summary.sex_ratio == pytest.approx(summary.total_male / summary.total_female * 100)
+    else:
+        assert summary.sex_ratio is None
+
+    assert summary.kecamatan_terbesar == (summary.kecamatan_ranking[0] if summary.kecamatan_ranking else ('-', 0))
+    assert summary.top3_kecamatan == summary.kecamatan_ranking[:3]
+
+
+def test_growth_series(frame, cube):
+    summary = dash.compute_summary(dash.select_cube(cube, YEARS[-1]), cube)
+    totals = [reference(frame, y)['jumlah'].sum() for y in YEARS]
+    assert summary.growth_years == YEARS
+    assert summary.growth_series[0] is None
+    assert summary.growth_series[1:] == pytest.approx(
+        [(totals[i] - totals[i - 1]) / totals[i - 1] * 100 for i in range(1, len(YEARS))]
+    )
+    assert summary.has_previous
+    assert summary.growth == totals[-1] - totals[-2]
+
+
+def test_empty_selection(cube):
+    # Wilayah tanpa baris di tahun ini: KPI nol, bukan ZeroDivisionError
+    year, kelurahan = MISSING
+    summary = dash.compute_summary(dash.select_cube(cube, year, (), (kelurahan,)), cube)
+    assert (summary.total, summary.usia_produktif) == (0, 0)
+    assert (summary.pct_produktif, summary.rasio_dependensi, summary.sex_ratio) == (0, 0, None)
+    assert summary.kecamatan_terbesar == ('-', 0)